@@ -0,0 +1,320 @@
+import math
+from urllib.parse import quote, unquote
+
+import sketches
+
+NUMERIC_CATEGORIES = ("EscalaCalificacion", "Numericas")
+CHOICE_CATEGORIES = ("EleccionSimples", "EleccionMultiples")
+HISTOGRAM_BINS = 10
+
+
+def pipeline(id):
+    """
+    Agregación sobre `respuestas` que devuelve solo conteos: respuestas por
+    pregunta, frecuencia de cada valor respondido (sin las Abiertas) y
+    respuestas por día. Las estadísticas finales se calculan en `summarize`
+    a partir de esos conteos, sin traer respuestas a Flask.
+    """
+    return [
+        {"$match": {"NumeroEncuesta": id}},
+        {"$project": {"_id": 0, "FechaRealizado": 1, "Preguntas.Numero": 1, "Preguntas.Categoria": 1, "Preguntas.Respuesta": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "preguntas": [
+                {"$unwind": "$Preguntas"},
+                {"$group": {
+                    "_id": "$Preguntas.Numero",
+                    "Categoria": {"$first": "$Preguntas.Categoria"},
+                    "Respuestas": {"$sum": 1}
+                }}
+            ],
+            "valores": [
+                {"$unwind": "$Preguntas"},
+                {"$match": {"Preguntas.Categoria": {"$ne": "Abiertas"}}},
+                {"$unwind": "$Preguntas.Respuesta"},
+                {"$group": {
+                    "_id": {"Numero": "$Preguntas.Numero", "Valor": "$Preguntas.Respuesta"},
+                    "n": {"$sum": 1}
+                }}
+            ],
+            "por_dia": [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$FechaRealizado"}},
+                    "n": {"$sum": 1}
+                }},
+                {"$sort": {"_id": 1}}
+            ]
+        }}
+    ]
+
+
+def from_pipeline(result):
+    # Convierte la salida de `pipeline` a la forma que usa `summarize`
+    counts = {
+        "total": result["total"][0]["n"] if result["total"] else 0,
+        "preguntas": {},
+        "por_dia": {row["_id"]: row["n"] for row in result["por_dia"]},
+    }
+    for row in result["preguntas"]:
+        counts["preguntas"][row["_id"]] = {"Categoria": row["Categoria"], "Respuestas": row["Respuestas"], "Valores": {}}
+    for row in result["valores"]:
+        question = counts["preguntas"].get(row["_id"]["Numero"])
+        if question is not None:
+            question["Valores"][row["_id"]["Valor"]] = row["n"]
+    return counts
+
+
+# Estadística materializada (colección `estadisticas`, un documento por encuesta):
+# {
+#     "_id": NumeroEncuesta,
+#     "Total": n,
+#     "PorDia": {"AAAA-MM-DD": n},
+#     "Preguntas": {"<Numero>": {"Categoria": c, "Respuestas": n, "Valores": {"<valor>": n},
+#                                "Cuantiles": {...}, "Terminos": {...}}},
+#     "Encuestados": {"<registro>": rho}
+# }
+# Se actualiza con $inc/$max en cada respuesta; los valores se codifican
+# como nombres de campo válidos para MongoDB. Cuantiles (preguntas
+# numéricas), Terminos (abiertas) y Encuestados son los resúmenes
+# aproximados de `sketches`.
+
+def encode_key(value):
+    # "." es un carácter no reservado para quote pero separa campos en MongoDB
+    # ("$" ya sale como %24)
+    return quote(str(value), safe="").replace(".", "%2E")
+
+
+def decode_key(key, category):
+    value = unquote(key)
+    if category in NUMERIC_CATEGORIES or category == "SiNo":
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+def _add(target, increments):
+    for field, n in increments.items():
+        target[field] = target.get(field, 0) + n
+
+
+def increments(answers):
+    """
+    Actualizaciones ($inc/$set/$max) de la estadística materializada para
+    un lote de respuestas, agrupadas por NumeroEncuesta.
+    """
+    updates = {}
+    for answer in answers:
+        update = updates.setdefault(answer["NumeroEncuesta"], {"$inc": {}, "$set": {}, "$max": {}})
+        inc = update["$inc"]
+        day = answer["FechaRealizado"].strftime("%Y-%m-%d")
+        _add(inc, {"Total": 1, f"PorDia.{day}": 1})
+        for field, rho in sketches.hll_updates("Encuestados", [answer["IdEncuestado"]]).items():
+            update["$max"][field] = max(update["$max"].get(field, 0), rho)
+        for question in answer["Preguntas"]:
+            base = f"Preguntas.{question['Numero']}"
+            update["$set"][f"{base}.Categoria"] = question["Categoria"]
+            _add(inc, {f"{base}.Respuestas": 1})
+            if question["Categoria"] == "Abiertas":
+                _add(inc, sketches.cms_increments(f"{base}.Terminos", sketches.tokenize(question["Respuesta"])))
+                continue
+            values = question["Respuesta"] if isinstance(question["Respuesta"], list) else [question["Respuesta"]]
+            for value in values:
+                if value == "":
+                    continue
+                _add(inc, {f"{base}.Valores.{encode_key(value)}": 1})
+            if question["Categoria"] in NUMERIC_CATEGORIES:
+                numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+                _add(inc, sketches.quantile_increments(f"{base}.Cuantiles", numbers))
+    return updates
+
+
+def touched_terms(answers):
+    # {NumeroEncuesta: {Numero: [términos]}} de las preguntas abiertas
+    terms = {}
+    for answer in answers:
+        for question in answer["Preguntas"]:
+            if question["Categoria"] == "Abiertas":
+                tokens = sketches.tokenize(question["Respuesta"])
+                if tokens:
+                    terms.setdefault(answer["NumeroEncuesta"], {}).setdefault(question["Numero"], []).extend(tokens)
+    return terms
+
+
+def terms_projection(questions):
+    fields = set()
+    for number, terms in questions.items():
+        fields |= sketches.cms_fields(f"Preguntas.{number}.Terminos", terms)
+    return {field: 1 for field in fields}
+
+
+def heavy_hitter_updates(document, questions):
+    # $max de los términos que superan el umbral de frecuentes
+    candidates = {}
+    for number, terms in questions.items():
+        summary = document.get("Preguntas", {}).get(str(number), {}).get("Terminos", {})
+        candidates.update(sketches.heavy_hitter_updates(f"Preguntas.{number}.Terminos", summary, terms))
+    return {"$max": candidates} if candidates else None
+
+
+def apply_update(document, update):
+    # Aplica $inc/$max/$set sobre un documento en memoria (para recalcular)
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            target = document
+            *parents, field = path.split(".")
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            if operator == "$inc":
+                target[field] = target.get(field, 0) + value
+            elif operator == "$max":
+                target[field] = max(target.get(field, value), value)
+            else:
+                target[field] = value
+    return document
+
+
+def from_materialized(document):
+    counts = {
+        "total": document.get("Total", 0),
+        "preguntas": {},
+        "por_dia": document.get("PorDia", {}),
+        "aproximado": {"Encuestados": document.get("Encuestados", {}), "preguntas": {}},
+    }
+    for number, question in document.get("Preguntas", {}).items():
+        category = question.get("Categoria")
+        counts["preguntas"][int(number)] = {
+            "Categoria": category,
+            "Respuestas": question.get("Respuestas", 0),
+            "Valores": {decode_key(key, category): n for key, n in question.get("Valores", {}).items()},
+        }
+        counts["aproximado"]["preguntas"][int(number)] = {
+            "Cuantiles": question.get("Cuantiles", {}),
+            "Terminos": question.get("Terminos", {}),
+        }
+    return counts
+
+
+def numeric_stats(values):
+    """Media, mediana, desviación estándar e histograma a partir de {valor: frecuencia}."""
+    values = {value: n for value, n in values.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    n = sum(values.values())
+    if n == 0:
+        return {"Media": None, "Mediana": None, "DesviacionEstandar": None, "Minimo": None, "Maximo": None, "Histograma": []}
+    total = sum(value * count for value, count in values.items())
+    mean = total / n
+    variance = sum(count * (value - mean) ** 2 for value, count in values.items()) / n
+    ordered = sorted(values.items())
+    return {
+        "Media": mean,
+        "Mediana": median(ordered, n),
+        "DesviacionEstandar": math.sqrt(variance),
+        "Minimo": ordered[0][0],
+        "Maximo": ordered[-1][0],
+        "Histograma": histogram(ordered),
+    }
+
+
+def median(ordered, n):
+    # `ordered` es una lista de (valor, frecuencia) ordenada por valor
+    middle = [(n - 1) // 2, n // 2]
+    found = []
+    seen = 0
+    for value, count in ordered:
+        while middle and middle[0] < seen + count:
+            found.append(value)
+            middle.pop(0)
+        seen += count
+    return (found[0] + found[1]) / 2
+
+
+def histogram(ordered):
+    # Pocos valores distintos (p. ej. una escala): un conteo por valor;
+    # si no, HISTOGRAM_BINS intervalos de igual ancho.
+    if len(ordered) <= HISTOGRAM_BINS:
+        return [{"Desde": value, "Hasta": value, "Respuestas": count} for value, count in ordered]
+    low, high = ordered[0][0], ordered[-1][0]
+    width = (high - low) / HISTOGRAM_BINS
+    bins = [0] * HISTOGRAM_BINS
+    for value, count in ordered:
+        bins[min(int((value - low) / width), HISTOGRAM_BINS - 1)] += count
+    return [
+        {"Desde": low + i * width, "Hasta": low + (i + 1) * width, "Respuestas": count}
+        for i, count in enumerate(bins)
+    ]
+
+
+def question_stats(category, values, options=None):
+    if category == "SiNo":
+        yes, no = values.get(1, 0), values.get(0, 0)
+        return {"Si": yes, "No": no, "ProporcionSi": yes / (yes + no) if yes + no else None}
+    if category in CHOICE_CATEGORIES:
+        tally = {option: 0 for option in options or []}
+        for value, count in values.items():
+            tally[value] = tally.get(value, 0) + count
+        return {"Opciones": [
+            {"Opcion": option, "Respuestas": count}
+            for option, count in sorted(tally.items(), key=lambda item: -item[1])
+        ]}
+    if category in NUMERIC_CATEGORIES:
+        return numeric_stats(values)
+    return {}
+
+
+def approximate_stats(category, summary):
+    if category in NUMERIC_CATEGORIES:
+        quantiles = summary.get("Cuantiles", {})
+        return {"Percentiles": {
+            f"p{int(q * 100)}": sketches.quantile(quantiles, q) for q in (0.25, 0.5, 0.75, 0.9, 0.99)
+        }, "ErrorRelativo": sketches.QUANTILE_ACCURACY}
+    if category == "Abiertas":
+        terms = summary.get("Terminos", {})
+        return {
+            "TerminosFrecuentes": [{"Termino": term, "Frecuencia": n} for term, n in sketches.top_terms(terms)],
+            "Terminos": terms.get("Tokens", 0),
+            "ErrorMaximo": sketches.CMS_ERROR * terms.get("Tokens", 0),
+        }
+    return {}
+
+
+def summarize(counts, survey, approx=False):
+    """
+    Arma el análisis de la encuesta a partir de los conteos (de
+    `from_pipeline` o `from_materialized`) y de la definición de la encuesta.
+    Con `approx` agrega los resúmenes aproximados, si existen.
+    """
+    approximate = counts.get("aproximado") if approx else None
+    definitions = {question["Numero"]: question for question in survey.get("Preguntas", [])}
+    numbers = sorted(set(definitions) | set(counts["preguntas"]))
+    questions = []
+    for number in numbers:
+        definition = definitions.get(number, {})
+        question = counts["preguntas"].get(number, {"Respuestas": 0, "Valores": {}})
+        category = definition.get("Categoria", question.get("Categoria"))
+        summary = {
+            "Numero": number,
+            "Categoria": category,
+            "Pregunta": definition.get("Pregunta"),
+            "Respuestas": question["Respuestas"],
+        }
+        summary.update(question_stats(category, question["Valores"], definition.get("Opciones")))
+        if approximate:
+            summary["Aproximado"] = approximate_stats(category, approximate["preguntas"].get(number, {}))
+        questions.append(summary)
+    result = {
+        "NumeroEncuesta": survey["NumeroEncuesta"],
+        "Titulo": survey.get("Titulo"),
+        "TotalRespuestas": counts["total"],
+        "Preguntas": questions,
+        "RespuestasPorDia": [{"Fecha": day, "Respuestas": n} for day, n in sorted(counts["por_dia"].items())],
+    }
+    if approximate:
+        result["EncuestadosDistintos"] = {
+            "Estimado": sketches.hll_count(approximate["Encuestados"]),
+            "ErrorEstandar": sketches.HLL_ERROR,
+        }
+    return result
@@ -30,6 +30,9 @@ class AppService:
     def login_user(self, user_data):
         return self.database.login_user(user_data)
 
+    def logout_user(self, token):
+        return self.database.logout_user(token)
+
     # Usuarios
     def get_users(self):
         return self.database.get_users()
@@ -38,8 +41,8 @@ class AppService:
     def insert_survey(self, data):
         return self.database.insert_survey(data)
 
-    def get_public_surveys(self, page=1, limit=10):
-        return self.database.get_public_surveys(page, limit)
+    def get_public_surveys(self, page=1, limit=10, after=None):
+        return self.database.get_public_surveys(page, limit, after)
     
     def get_specific_survey(self, id):
         return self.database.get_specific_survey(id)
@@ -67,8 +70,12 @@ class AppService:
         return self.database.delete_question(id, questionId, data)
     def post_response(self, id, data):
         return self.database.post_response(id, data)
-    def get_responses(self, id):
-        return self.database.get_responses(id)
+    def enqueue_response(self, id, data, idempotency_key=None):
+        return self.database.enqueue_response(id, data, idempotency_key)
+    def post_responses_bulk(self, id, token, rows):
+        return self.database.post_responses_bulk(id, token, rows)
+    def iter_responses(self, id, **filters):
+        return self.database.iter_responses(id, **filters)
     def post_encuestado(self, data):
         return self.database.post_encuestado(data)
     def get_encuestados(self, data):
@@ -79,5 +86,73 @@ class AppService:
         return self.database.actualizar_encuestado(id, data)
     def eliminar_encuestado(self, id):
         return self.database.eliminar_encuestado(id)
-    def get_analytics(self, id):
-        return self.database.get_analytics(id)
\ No newline at end of file
+    def get_analytics(self, id, approx=False):
+        return self.database.get_analytics(id, approx)
+
+class AsyncAppService:
+    """AppService del modo ASGI sobre AsyncDatabase."""
+
+    def __init__(self, database):
+        self.database = database
+
+    # Autenticación y Autorización
+    async def insert_user(self, user_data):
+        return await self.database.insert_user(user_data)
+
+    async def login_user(self, user_data):
+        return await self.database.login_user(user_data)
+
+    async def logout_user(self, token):
+        return await self.database.logout_user(token)
+
+    # Usuarios
+    async def get_users(self):
+        return await self.database.get_users()
+
+    # Encuestas
+    async def insert_survey(self, data):
+        return await self.database.insert_survey(data)
+
+    async def get_public_surveys(self, page=1, limit=10, after=None):
+        return await self.database.get_public_surveys(page, limit, after)
+
+    async def get_specific_survey(self, id):
+        return await self.database.get_specific_survey(id)
+
+    async def update_survey(self, id, data):
+        return await self.database.update_survey(id, data)
+
+    async def delete_survey(self, id, data):
+        return await self.database.delete_survey(id, data)
+
+    async def publish_survey(self, id, data):
+        return await self.database.publish_survey(id, data)
+
+    # Preguntas de encuestas
+    async def insert_question(self, id, data):
+        return await self.database.insert_question(id, data)
+
+    async def get_questions(self, id):
+        return await self.database.get_questions(id)
+
+    async def update_question(self, id, questionId, data):
+        return await self.database.update_question(id, questionId, data)
+
+    async def delete_question(self, id, questionId, data):
+        return await self.database.delete_question(id, questionId, data)
+
+    # Respuestas
+    async def post_response(self, id, data):
+        return await self.database.post_response(id, data)
+
+    async def enqueue_response(self, id, data, idempotency_key=None):
+        return await self.database.enqueue_response(id, data, idempotency_key)
+
+    async def post_responses_bulk(self, id, token, rows):
+        return await self.database.post_responses_bulk(id, token, rows)
+
+    def iter_responses(self, id, **filters):
+        return self.database.iter_responses(id, **filters)
+
+    async def get_analytics(self, id, approx=False):
+        return await self.database.get_analytics(id, approx)
@@ -0,0 +1,339 @@
+"""
+Modo ASGI de la API: las mismas rutas de app.py sobre Quart y AsyncDatabase.
+
+    hypercorn asgi:app --bind 0.0.0.0:5000
+
+Las rutas de /respondents (sin probar en app.py) solo están en el modo WSGI.
+"""
+import json
+from datetime import datetime
+
+import redis.asyncio as aioredis
+from bson import ObjectId
+from quart import Quart, Response, request, jsonify
+
+from app_service import AsyncAppService
+from async_db import AsyncDatabase
+from cache import AsyncCache, LocalCache
+from pagination import encode_cursor, decode_cursor
+from serialization import dumps
+from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, mongo_uri, REDIS_HOST, REDIS_PORT, RESPONSES_BATCH_SIZE, INGESTA_ASINCRONA, BULK_MAX_ROWS
+from config import CACHE_TTL_SURVEYS, CACHE_TTL_SURVEY, CACHE_TTL_QUESTIONS, CACHE_NEGATIVE_TTL, CACHE_LOCAL_SIZE, CACHE_LOCAL_TTL
+
+redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+cache_redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+cache = AsyncCache(cache_redis_client, negative_ttl=CACHE_NEGATIVE_TTL,
+                   local=LocalCache(maxsize=CACHE_LOCAL_SIZE, ttl=CACHE_LOCAL_TTL))
+
+db = AsyncDatabase(database=DB_NAME, host=DB_HOST, user=DB_USER, password=DB_PASSWORD, port=DB_PORT, uri=mongo_uri, redis_client=redis_client)
+
+app = Quart(__name__)
+appService = AsyncAppService(db)
+cache.subscribe(db.apply_invalidations)
+
+
+@app.before_serving
+async def startup():
+    await db.connect()
+    await cache.listen()
+
+
+@app.after_serving
+async def shutdown():
+    await cache.stop()
+    await db.close()
+    await redis_client.aclose()
+    await cache_redis_client.aclose()
+
+
+# Cache
+async def cached_json(key, loader, ttl, not_found, headers=None, local=False):
+    entry = await cache.fetch(key, loader, ttl, headers, local=local)
+    if entry is None:
+        return jsonify({"error": not_found}), 404
+    return Response(entry.body, headers=entry.headers, mimetype="application/json")
+
+def json_response(data, status=200):
+    # Misma serialización que las respuestas en caché (fechas en ISO 8601)
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+# Cache cleaner
+async def cache_cleaner_all_surveys(id, questions=False):
+    keys = [f"survey:{id}"]
+    if questions:
+        keys.append(f"survey_questions:{id}")
+    await cache.invalidate(keys, namespaces=["surveys"])
+
+@app.route("/")
+async def home():
+    return "App Works!!!"
+
+# Autenticación y Autorización
+@app.route("/auth/register", methods=["POST"])
+async def insert_user():
+    user_data = await request.get_json()
+    await appService.insert_user(user_data)
+    return user_data
+
+@app.route("/auth/login", methods=["POST"])
+async def login_user():
+    user_data = await request.get_json()
+    token = await appService.login_user(user_data)
+    return token
+
+@app.route("/auth/logout", methods=["POST"])
+async def logout_user():
+    data = await request.get_json()
+    if await appService.logout_user(data.get("Token")):
+        return "Sesión cerrada", 200
+    return jsonify({"error": "Token not found or already closed"}), 404
+
+# Usuarios
+@app.route("/users", methods=["GET"])
+async def get_users():
+    users = await appService.get_users()
+    return jsonify(users)
+
+# Encuestas
+@app.route("/surveys", methods=["POST"])
+async def insert_survey():
+    try:
+        data_with_token = await request.get_json()
+        result = await appService.insert_survey(data_with_token)
+        if result.inserted_id:
+            await cache_cleaner_all_surveys(data_with_token["NumeroEncuesta"], questions=True)
+            data_with_token['_id'] = str(result.inserted_id)
+            return json_response(data_with_token, 201)
+        else:
+            return jsonify({"error": "Failed to insert survey"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys", methods=["GET"])
+async def get_public_surveys_after():
+    return await public_surveys_response(1)
+
+@app.route("/surveys/page=<int:num_page>", methods=["GET"])
+async def get_public_surveys(num_page):
+    return await public_surveys_response(num_page)
+
+async def public_surveys_response(num_page):
+    try:
+        page = int(request.args.get('page', num_page))
+        limit = int(request.args.get('limit', 10))
+        after = request.args.get('after')
+        after = decode_cursor(after) if after else None
+        if page < 1 or limit < 1:
+            raise ValueError("page and limit must be positive")
+    except ValueError:
+        return jsonify({"error": "Invalid page, limit or cursor value"}), 400
+
+    def next_cursor(surveys):
+        if len(surveys) == limit:
+            return {"X-Next-Cursor": encode_cursor(surveys[-1]["NumeroEncuesta"])}
+        return {}
+
+    try:
+        version = await cache.version("surveys")
+        if after is not None:
+            cache_key = f"surveys:v{version}:after:{after}:{limit}"
+        else:
+            cache_key = f"surveys:v{version}:{page}:{limit}"
+        return await cached_json(cache_key, lambda: appService.get_public_surveys(page, limit, after),
+                                 CACHE_TTL_SURVEYS, "Surveys not found", headers=next_cursor)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/surveys/<int:id>", methods=["GET"])
+async def get_specific_survey(id):
+    try:
+        return await cached_json(f"survey:{id}", lambda: appService.get_specific_survey(id),
+                                 CACHE_TTL_SURVEY, "Survey not found", local=True)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>", methods=["PUT"])
+async def update_survey(id):
+    data = await request.get_json()
+    try:
+        data = await appService.update_survey(id, data)
+        if data is None:
+            return jsonify({"error": "Survey not found"}), 404
+        await cache_cleaner_all_surveys(id)
+        return json_response(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>", methods=["DELETE"])
+async def delete_survey(id):
+    try:
+        data = await request.get_json()
+        flag = await appService.delete_survey(id, data)
+        if flag:
+            await cache_cleaner_all_surveys(id)
+            return "Encuesta eliminada", 200
+        return jsonify({"error": "Survey not found or no permission to delete"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>/publish", methods=["POST"])
+async def publish_survey(id):
+    try:
+        data = await request.get_json()
+        flag = await appService.publish_survey(id, data)
+        if flag:
+            await cache_cleaner_all_surveys(id)
+            return "Encuesta publicada", 200
+        return jsonify({"error": "Survey not found or no permission to publish"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Preguntas de Encuestas
+@app.route("/surveys/<int:id>/questions", methods=["POST"])
+async def insert_question(id):
+    try:
+        data = await request.get_json()
+        result = await appService.insert_question(id, data)
+        if result:
+            await cache_cleaner_all_surveys(id, questions=True)
+            return json_response(data, 201)
+        else:
+            return jsonify({"error": "Failed to insert question"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>/questions", methods=["GET"])
+async def get_questions(id):
+    async def load_questions():
+        survey = await appService.get_questions(id)
+        return survey.get("Preguntas", []) if survey else None
+
+    try:
+        return await cached_json(f"survey_questions:{id}", load_questions, CACHE_TTL_QUESTIONS, "Survey not found",
+                                 local=True)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>/questions/<int:questionId>", methods=["PUT"])
+async def update_question(id, questionId):
+    data = await request.get_json()
+    try:
+        data_db = await appService.update_question(id, questionId, data)
+        if data_db is None:
+            return jsonify({"error": "Question not found or no permission to update"}), 404
+        await cache_cleaner_all_surveys(id, questions=True)
+        return json_response(data_db)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>/questions/<int:questionId>", methods=["DELETE"])
+async def delete_question(id, questionId):
+    try:
+        data = await request.get_json()
+        data_db = await appService.delete_question(id, questionId, data)
+        if data_db:
+            await cache_cleaner_all_surveys(id, questions=True)
+            return "Pregunta eliminada\n" + str(data_db), 200
+        return jsonify({"error": "Question not found or no permission to delete"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Respuestas de encuestas
+@app.route("/surveys/<int:id>/responses", methods=["POST"])
+async def post_response(id):
+    try:
+        data = await request.get_json()
+        if INGESTA_ASINCRONA or request.args.get('async', 'false').lower() in ('1', 'true'):
+            receipt = await appService.enqueue_response(id, data, request.headers.get("Idempotency-Key"))
+            if receipt:
+                return jsonify({"Recibo": receipt}), 202
+            return jsonify({"error": "Failed to enqueue response"}), 400
+        result = await appService.post_response(id, data)
+        if result:
+            return str(data), 201
+        else:
+            return jsonify({"error": "Failed to insert response"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/surveys/<int:id>/responses/bulk", methods=["POST"])
+async def post_responses_bulk(id):
+    try:
+        token = request.headers.get("Token")
+        if request.mimetype == "application/x-ndjson":
+            body = await request.get_data(as_text=True)
+            rows = [parse_ndjson_line(line) for line in body.splitlines() if line.strip()]
+        else:
+            body = await request.get_json()
+            if isinstance(body, dict):
+                token = body.get("Token", token)
+                body = body.get("Respuestas")
+            if not isinstance(body, list):
+                return jsonify({"error": "Expected a JSON array or NDJSON body"}), 400
+            rows = body
+        if len(rows) > BULK_MAX_ROWS:
+            return jsonify({"error": f"At most {BULK_MAX_ROWS} responses per request"}), 413
+        result = await appService.post_responses_bulk(id, token, rows)
+        if result is None:
+            return jsonify({"error": "Invalid or inactive token"}), 401
+        return json_response(result, 201 if result["Insertadas"] else 400)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def parse_ndjson_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+@app.route("/surveys/<int:id>/responses", methods=["GET"])
+async def get_responses(id):
+    try:
+        after = request.args.get('after')
+        if after and not ObjectId.is_valid(after):
+            raise ValueError("Invalid cursor")
+        limit = request.args.get('limit', type=int)
+        fields = request.args.get('fields')
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        responses = appService.iter_responses(
+            id,
+            after=after,
+            limit=limit,
+            fields=fields.split(',') if fields else None,
+            desde=datetime.fromisoformat(desde) if desde else None,
+            hasta=datetime.fromisoformat(hasta) if hasta else None,
+            batch_size=request.args.get('batch_size', RESPONSES_BATCH_SIZE, type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.args.get('format') == 'json':
+        return Response(json_array_chunks(responses), mimetype="application/json")
+    return Response(ndjson_lines(responses), mimetype="application/x-ndjson")
+
+async def ndjson_lines(documents):
+    async for document in documents:
+        yield dumps(document) + b"\n"
+
+async def json_array_chunks(documents):
+    yield b"["
+    separator = b""
+    async for document in documents:
+        yield separator + dumps(document)
+        separator = b","
+    yield b"]"
+
+#analytics
+@app.route("/surveys/<int:id>/analysis", methods=["GET"])
+async def get_analytics(id):
+    try:
+        approx = request.args.get('approx', 'false').lower() in ('1', 'true')
+        analysis = await appService.get_analytics(id, approx)
+        if analysis is None:
+            return jsonify({"error": "Survey not found"}), 404
+        return json_response(analysis)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
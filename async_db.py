@@ -0,0 +1,408 @@
+import asyncio
+from datetime import datetime
+
+import asyncpg
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from quart import g, has_request_context
+
+from config import RESPONSES_BATCH_SIZE, PG_POOL_MIN, PG_POOL_MAX, PG_POOL_TIMEOUT
+from config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_CACHE_REDIS_TTL, SURVEY_VALIDATOR_TTL
+from db import answer_validator, OWNER_PROJECTION, survey_owner_query, prepare_bulk_rows, bulk_summary, responses_query, highest_question_number, responses_projection
+from cache import INVALIDATION_CHANNEL
+from json_schemas import answer_schema
+from token_cache import AsyncTokenCache
+from validation import compile_survey, missing_survey, ValidatorCache
+import analytics
+import authorization
+import ingestion
+
+
+def _token_id(token):
+    # Logs.Token es SERIAL; asyncpg no convierte textos como psycopg2
+    try:
+        return int(token)
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncDatabase:
+    """
+    Database para el modo ASGI: las mismas operaciones sobre motor, asyncpg
+    y redis.asyncio. Las consultas independientes de una petición (token y
+    encuesta, por ejemplo) se hacen a la vez con asyncio.gather. El esquema,
+    los índices y la carga inicial siguen a cargo de `manage.py`.
+    """
+
+    def __init__(
+            self, database="db_name", host="db_host", user="db_user",
+            password="db_pass", port="db_port", uri="mongodb:mongoadmin:mongosecretmongodb:27017/",
+            redis_client=None):
+        self.settings = {"database": database, "host": host, "user": user, "password": password,
+                         "port": int(port) if port else None}
+        self.uri = uri
+        self.database = database
+        self.pool = None
+        self.client = None
+
+        # Redis (caché de sesiones e ingesta asíncrona)
+        self.redis = redis_client
+        self.token_cache = AsyncTokenCache(redis_client, AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_CACHE_REDIS_TTL)
+        self.validators = ValidatorCache(SURVEY_VALIDATOR_TTL)
+
+    async def connect(self):
+        # Se abre dentro del event loop del servidor
+        self.pool = await asyncpg.create_pool(
+            min_size=PG_POOL_MIN, max_size=PG_POOL_MAX, timeout=PG_POOL_TIMEOUT, **self.settings)
+        self.client = AsyncIOMotorClient(self.uri)
+        self.db = self.client[self.database]
+        self.encuestas = self.db["encuestas"]
+        self.respuestas = self.db["respuestas"]
+        self.contadores = self.db["contadores"]
+        self.estadisticas = self.db["estadisticas"]
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+        if self.client is not None:
+            self.client.close()
+
+    # Verificar token
+    async def get_session(self, token):
+        if token is None:
+            return None
+        session = await self.token_cache.get(token)
+        if session:
+            return session
+        token_id = _token_id(token)
+        if token_id is None:
+            return None
+        user = await self.pool.fetchrow("SELECT id, idRol, activo FROM OBTENER_SESION($1);", token_id)
+        if not user:
+            return None
+        session = (user[0], user[1], user[2])
+        await self.token_cache.set(token, session)
+        return session
+
+    async def get_token(self, token):
+        session = await self.get_session(token)
+        return session[1] if session else 0
+
+    async def verify_token_admin(self, token):
+        return await self.get_token(token) == 1
+
+    async def verify_token_active(self, token):
+        session = await self.get_session(token)
+        return True if session and session[2] else False
+
+    async def verify_token_create_surveys(self, token):
+        return await self.get_token(token) in [1, 2]
+
+    async def verify_token_creator_survey(self, idAutor, num_encuesta, token):
+        return await self.authorize_survey(idAutor, num_encuesta, token)
+
+    async def authorize_survey(self, idAutor, num_encuesta, token):
+        key = (str(token), idAutor, num_encuesta)
+        decisions = g.setdefault('autorizaciones', {}) if has_request_context() else {}
+        if key not in decisions:
+            decisions[key] = await self._authorize_survey(idAutor, num_encuesta, token)
+        return decisions[key]
+
+    async def _authorize_survey(self, idAutor, num_encuesta, token):
+        # La sesión y el autor de la encuesta se consultan a la vez aunque
+        # para administradores sobre la segunda consulta
+        session, owner = await asyncio.gather(
+            self.get_session(token),
+            self.encuestas.find_one(survey_owner_query(num_encuesta, idAutor), OWNER_PROJECTION))
+        return authorization.decide_survey(session, idAutor, lambda: owner is not None)
+
+    # Autenticación y Autorización
+    async def insert_user(self, user_data):
+        await self.pool.execute(
+            "CALL INSERTAR_USUARIO($1, $2, $3, $4, $5, $6, $7, $8);",
+            user_data['Nombre'], int(user_data['idRol']), user_data['Correo'], user_data['Contrasenna'],
+            datetime.fromisoformat(user_data['FechaCreacion']), datetime.fromisoformat(user_data['FechaNacimiento']),
+            user_data['Genero'], str(user_data['idPais']))
+
+    async def login_user(self, user_data):
+        return await self.pool.fetchval(
+            "CALL LOGIN_USUARIO($1, $2, $3, $4);",
+            user_data['Correo'], user_data['Contrasenna'], datetime.now(), None)
+
+    async def logout_user(self, token):
+        status = await self.pool.execute(
+            "UPDATE Logs SET FechaLogOut = NOW() WHERE Token = $1 AND FechaLogOut IS NULL;", _token_id(token))
+        await self.token_cache.invalidate(token)
+        return status != "UPDATE 0"
+
+    # Usuarios
+    async def get_users(self):
+        # ::text deja cada fila como la devuelve psycopg2
+        rows = await self.pool.fetch("SELECT (U.id, U.Nombre, R.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre)::text FROM Usuarios AS U INNER JOIN Roles AS R ON U.idRol = R.id INNER JOIN Paises AS P ON U.idPais = P.id;")
+        return [tuple(row) for row in rows]
+
+    # Encuestas
+    async def insert_survey(self, data):
+        try:
+            token = data.pop("Token", 0)
+            if token == 0:
+                raise ValueError("Token is required")
+
+            if await self.verify_token_create_surveys(token):
+                data['FechaCreacion'] = datetime.fromisoformat(data['FechaCreacion'])
+                data['FechaActualizacion'] = datetime.fromisoformat(data['FechaActualizacion'])
+                insert_result = await self.encuestas.insert_one(data)
+                await self._invalidate_validator(data.get('NumeroEncuesta'))
+                return insert_result
+            else:
+                raise Exception("You don't have permission to create this survey.")
+        except Exception as e:
+            raise Exception(f"An error occurred during survey insertion: {str(e)}")
+
+    async def get_public_surveys(self, page=1, limit=10, after=None):
+        query = {"Disponible": 1}
+        if after is not None:
+            query["NumeroEncuesta"] = {"$gt": after}
+            surveys = self.encuestas.find(query).sort("NumeroEncuesta", 1).limit(limit)
+        else:
+            offset = (page - 1) * limit
+            surveys = self.encuestas.find(query).sort("NumeroEncuesta", 1).skip(offset).limit(limit)
+        result = []
+        async for survey in surveys:
+            survey['_id'] = str(survey['_id'])
+            result.append(survey)
+        return result
+
+    async def get_specific_survey(self, id):
+        survey = await self.encuestas.find_one({"NumeroEncuesta": id})
+        if survey:
+            survey['_id'] = str(survey['_id'])
+        return survey
+
+    async def update_survey(self, id, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token):
+            data['FechaCreacion'] = datetime.fromisoformat(data['FechaCreacion'])
+            data['FechaActualizacion'] = datetime.fromisoformat(data['FechaActualizacion'])
+            if 'Preguntas' in data:
+                await self.sync_question_counter(id, highest_question_number(data['Preguntas']))
+            await self.encuestas.update_one({"NumeroEncuesta": id}, {"$set": data})
+            await self._invalidate_validator(id)
+            return data
+        return None
+
+    async def delete_survey(self, id, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token):
+            await asyncio.gather(
+                self.encuestas.delete_one({"NumeroEncuesta": id}),
+                self.contadores.delete_one({"_id": f"preguntas:{id}"}))
+            await self._invalidate_validator(id)
+            return True
+        return False
+
+    async def publish_survey(self, id, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token):
+            await self.encuestas.update_one({"NumeroEncuesta": id}, {"$set": {"Disponible": 1}})
+            return True
+        return False
+
+    # Preguntas de encuestas
+    async def insert_question(self, id, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token):
+            questions = data['Preguntas']
+            if isinstance(questions, dict):
+                questions = data['Preguntas'] = [questions]
+            if not questions:
+                return False
+            first_number = await self.reserve_question_numbers(id, len(questions))
+            numbers = list(range(first_number, first_number + len(questions)))
+            for question, number in zip(questions, numbers):
+                question['Numero'] = number
+            result = await self.encuestas.update_one(
+                {"NumeroEncuesta": id},
+                {"$push": {"Preguntas": {"$each": questions}}}
+            )
+            await self._invalidate_validator(id)
+            return numbers if result.matched_count else False
+        return False
+
+    async def reserve_question_numbers(self, id, count):
+        key = f"preguntas:{id}"
+        for _ in range(2):
+            counter = await self.contadores.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"Secuencia": count}},
+                return_document=ReturnDocument.AFTER
+            )
+            if counter:
+                return counter["Secuencia"] - count + 1
+            max_number = await self.encuestas.aggregate([
+                {'$match': {'NumeroEncuesta': id}},
+                {'$unwind': '$Preguntas'},
+                {'$group': {
+                    '_id': '$_id',
+                    'maxNumero': {'$max': '$Preguntas.Numero'}
+                }}
+            ]).to_list(length=1)
+            max_number = (max_number[0]['maxNumero'] or 0) if max_number else 0
+            try:
+                await self.contadores.update_one({"_id": key}, {"$max": {"Secuencia": max_number}}, upsert=True)
+            except DuplicateKeyError:
+                pass
+        raise Exception(f"Could not reserve question numbers for survey {id}")
+
+    async def sync_question_counter(self, id, max_number):
+        try:
+            await self.contadores.update_one({"_id": f"preguntas:{id}"}, {"$max": {"Secuencia": max_number}}, upsert=True)
+        except DuplicateKeyError:
+            await self.contadores.update_one({"_id": f"preguntas:{id}"}, {"$max": {"Secuencia": max_number}})
+
+    async def get_questions(self, id):
+        return await self.encuestas.find_one({"NumeroEncuesta": id}, {"_id": 0, "Preguntas": 1})
+
+    async def update_question(self, id, questionId, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token) and len(data["Preguntas"]) == 1:
+            question = data['Preguntas'][0]
+            question['Numero'] = questionId
+            result = await self.encuestas.update_one(
+                {"NumeroEncuesta": id, "Preguntas.Numero": questionId},
+                {"$set": {"Preguntas.$": question}}
+            )
+            await self._invalidate_validator(id)
+            return question if result.matched_count else None
+        return None
+
+    async def delete_question(self, id, questionId, data):
+        token = data.pop('Token', None)
+        idAutor = data.get('IdAutor')
+        if await self.verify_token_creator_survey(idAutor, id, token):
+            survey = await self.encuestas.find_one_and_update(
+                {"NumeroEncuesta": id, "Preguntas.Numero": questionId},
+                {"$pull": {"Preguntas": {"Numero": questionId}}},
+                projection={"_id": 0, "Preguntas.$": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            await self._invalidate_validator(id)
+            return survey['Preguntas'][0] if survey else None
+        return None
+
+    # Validación de respuestas
+    async def survey_validator(self, num_encuesta):
+        validator = self.validators.cached(num_encuesta)
+        if validator is None:
+            survey = await self.encuestas.find_one(
+                {"NumeroEncuesta": num_encuesta}, {"_id": 0, "NumeroEncuesta": 1, "Preguntas": 1})
+            if not survey:
+                return missing_survey(num_encuesta)
+            validator = self.validators.put(num_encuesta, compile_survey(survey, answer_schema))
+        return validator
+
+    async def _invalidate_validator(self, num_encuesta):
+        self.validators.invalidate(num_encuesta)
+        if self.redis is not None and num_encuesta is not None:
+            await self.redis.publish(INVALIDATION_CHANNEL, ValidatorCache.key(num_encuesta))
+
+    def apply_invalidations(self, keys):
+        self.validators.apply_invalidations(keys)
+        self.token_cache.apply_invalidations(keys)
+
+    async def validate_response(self, data):
+        try:
+            data['FechaRealizado'] = datetime.fromisoformat(data['FechaRealizado'])
+        except (KeyError, TypeError, ValueError):
+            pass  # lo reporta el validador
+        num_encuesta = data.get('NumeroEncuesta')
+        if not isinstance(num_encuesta, int) or isinstance(num_encuesta, bool):
+            return answer_validator(data)
+        return (await self.survey_validator(num_encuesta))(data)
+
+    async def post_response(self, id, data):
+        token = data.pop('Token', None)
+        errors, active = await asyncio.gather(self.validate_response(data), self.verify_token_active(token))
+        if errors:
+            raise ValueError("; ".join(errors))
+        if active:
+            await self.respuestas.insert_one(data)
+            await self.record_statistics([data])
+            return data
+        return None
+
+    async def enqueue_response(self, id, data, idempotency_key=None):
+        token = data.pop('Token', None)
+        errors, active = await asyncio.gather(self.validate_response(dict(data)), self.verify_token_active(token))
+        if errors:
+            raise ValueError("; ".join(errors))
+        if not active:
+            return None
+        return await ingestion.enqueue_async(self.redis, data, idempotency_key)
+
+    async def insert_responses(self, answers):
+        errors = {}
+        try:
+            await self.respuestas.insert_many(answers, ordered=False)
+        except BulkWriteError as e:
+            errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+        await self.record_statistics([answer for index, answer in enumerate(answers) if index not in errors])
+        return errors
+
+    async def post_responses_bulk(self, id, token, rows):
+        active, validator = await asyncio.gather(self.verify_token_active(token), self.survey_validator(id))
+        if not active:
+            return None
+        answers, row_numbers, errors = prepare_bulk_rows(id, rows, validator)
+        write_errors = await self.insert_responses(answers) if answers else {}
+        return bulk_summary(answers, row_numbers, errors, write_errors)
+
+    def iter_responses(self, id, after=None, limit=None, fields=None, desde=None, hasta=None, batch_size=RESPONSES_BATCH_SIZE):
+        # Valida y crea el cursor antes de transmitir; devuelve un generador asíncrono
+        projection = responses_projection(fields, limit, batch_size)
+        cursor = self.respuestas.find(responses_query(id, after, desde, hasta), projection).sort("_id", 1).batch_size(batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+        return self._iter_cursor(cursor)
+
+    @staticmethod
+    async def _iter_cursor(cursor):
+        async for response in cursor:
+            response['_id'] = str(response['_id'])
+            yield response
+
+    # Estadísticas
+    async def record_statistics(self, answers):
+        updates = []
+        for num_encuesta, update in analytics.increments(answers).items():
+            update = {operator: fields for operator, fields in update.items() if fields}
+            updates.append(UpdateOne({"_id": num_encuesta}, update, upsert=True))
+        if updates:
+            await self.estadisticas.bulk_write(updates, ordered=False)
+        for num_encuesta, questions in analytics.touched_terms(answers).items():
+            document = await self.estadisticas.find_one({"_id": num_encuesta}, analytics.terms_projection(questions))
+            update = analytics.heavy_hitter_updates(document or {}, questions)
+            if update:
+                await self.estadisticas.update_one({"_id": num_encuesta}, update)
+
+    async def get_analytics(self, id, approx=False):
+        survey, statistics = await asyncio.gather(
+            self.encuestas.find_one(
+                {"NumeroEncuesta": id},
+                {"_id": 0, "NumeroEncuesta": 1, "Titulo": 1, "Preguntas.Numero": 1, "Preguntas.Categoria": 1, "Preguntas.Pregunta": 1, "Preguntas.Opciones": 1}
+            ),
+            self.estadisticas.find_one({"_id": id}))
+        if not survey:
+            return None
+        if statistics:
+            counts = analytics.from_materialized(statistics)
+        else:
+            results = await self.respuestas.aggregate(analytics.pipeline(id)).to_list(length=1)
+            counts = analytics.from_pipeline(results[0])
+        return analytics.summarize(counts, survey, approx)
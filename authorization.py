@@ -0,0 +1,54 @@
+# Roles de Usuarios (ver database/00-init.sql)
+ADMIN = 1
+CREADOR = 2
+ENCUESTADO = 3
+
+
+class Decision:
+    """
+    Resultado de una verificación de permisos. Se evalúa como booleano,
+    así que puede usarse donde antes se esperaba True/False.
+    """
+
+    __slots__ = ("permitido", "usuario", "rol", "motivo")
+
+    def __init__(self, permitido, usuario=None, rol=None, motivo=None):
+        self.permitido = permitido
+        self.usuario = usuario
+        self.rol = rol
+        self.motivo = motivo
+
+    def __bool__(self):
+        return self.permitido
+
+    def __repr__(self):
+        return f"Decision(permitido={self.permitido}, usuario={self.usuario}, rol={self.rol}, motivo={self.motivo!r})"
+
+
+def allow(usuario, rol):
+    return Decision(True, usuario, rol)
+
+
+def deny(motivo, usuario=None, rol=None):
+    return Decision(False, usuario, rol, motivo)
+
+
+def decide_survey(session, idAutor, owns_survey):
+    """
+    Decisión para modificar una encuesta a partir de la sesión del token.
+    `owns_survey()` solo se consulta para creadores.
+    """
+    if not session:
+        return deny("token inválido")
+    user, role, active = session
+    if not active:
+        return deny("sesión cerrada", user, role)
+    if user != idAutor:
+        return deny("el token no pertenece al autor", user, role)
+    if role == ADMIN:
+        return allow(user, role)
+    if role != CREADOR:
+        return deny("el rol no puede modificar encuestas", user, role)
+    if not owns_survey():
+        return deny("la encuesta no pertenece al autor", user, role)
+    return allow(user, role)
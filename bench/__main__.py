@@ -0,0 +1,164 @@
+"""
+Benchmark de la API con la mezcla de peticiones de la colección de Postman.
+
+    python -m bench run --surveys 200 --questions 8 --answers 50 --requests 5000 --concurrency 8
+    python -m bench run --target http --url http://localhost:5002
+    python -m bench generate --output-dir bench/data
+    python -m bench compare bench/results/antes.json bench/results/despues.json
+
+`run` en proceso usa mongomock y fakeredis (`pip install -r requirements-bench.txt`)
+o los servidores reales con --mongo real / --redis real. Con --target http
+los datos se cargan antes con `bench generate` y `manage.py seed`. Los
+resultados se guardan en JSON para comparar entre commits.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench import backends, collection, dataset, runner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLLECTION = os.path.join(ROOT, "BDII-Proyecto1.postman_collection.json")
+RESULTS = os.path.join(ROOT, "bench", "results")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_weights(values):
+    weights = dict(collection.DEFAULT_WEIGHTS)
+    for value in values:
+        label, _, weight = value.rpartition("=")
+        if not label:
+            raise SystemExit(f"--weight expects 'METHOD /path=N', got {value!r}")
+        weights[label] = float(weight)
+    return weights
+
+
+def cmd_run(args):
+    surveys, answers = dataset.generate(args.surveys, args.questions, args.answers, args.seed)
+    if args.target == "http":
+        target = runner.HttpTarget(args.url)
+        round_trips = None
+    else:
+        target = runner.InProcessTarget(backends.in_process_app(surveys, answers, args.mongo, args.redis))
+        round_trips = backends.round_trips
+
+    templates = collection.load(args.collection, args.include_errors)
+    weights = parse_weights(args.weight)
+    new_numbers = collection.new_numbers(surveys)
+
+    def make_mix(index):
+        return collection.Mix(templates, weights, surveys, dataset.Generator(args.seed + 1 + index), new_numbers)
+
+    samples, elapsed = runner.run(target, make_mix, args.requests, args.concurrency, args.warmup)
+    result = runner.summarize(samples, elapsed, round_trips)
+    result["commit"] = git_commit()
+    result["date"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    result["config"] = {
+        "target": args.target, "mongo": args.mongo, "redis": args.redis, "surveys": args.surveys,
+        "questions": args.questions, "answers": args.answers, "seed": args.seed, "requests": args.requests,
+        "concurrency": args.concurrency, "warmup": args.warmup, "weights": weights,
+    }
+    print_result(result)
+
+    output = args.output or os.path.join(RESULTS, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2, sort_keys=True)
+    print(f"\nResultados en {output}")
+    return 1 if result["total"]["errors"] else 0
+
+
+def print_result(result):
+    print(f"{'endpoint':40} {'n':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}  idas y vueltas")
+    for label, summary in result["endpoints"].items():
+        trips = " ".join(f"{backend}={value:.1f}" for backend, value in summary.get("round_trips", {}).items())
+        print(f"{label:40} {summary['requests']:6d} {summary['errors']:4d} {summary['rps']:8.1f} "
+              f"{summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} {summary['p99_ms']:8.2f}  {trips}")
+    total = result["total"]
+    print(f"{'total':40} {total['requests']:6d} {total['errors']:4d} {total['rps']:8.1f} "
+          f"{total['p50_ms']:8.2f} {total['p95_ms']:8.2f} {total['p99_ms']:8.2f}")
+
+
+def cmd_generate(args):
+    surveys, answers = dataset.generate(args.surveys, args.questions, args.answers, args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, documents in (("surveys", surveys), ("answers", answers)):
+        path = os.path.join(args.output_dir, f"data_{name}.jsonl")
+        print(f"{path}: {dataset.write_jsonl(path, documents)} documentos")
+
+
+def cmd_compare(args):
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    regressions = 0
+    print(f"{'endpoint':40} {'p50':>16} {'p95':>16} {'rps':>16}")
+    rows = [(label, before["endpoints"][label], summary) for label, summary in after["endpoints"].items()
+            if label in before["endpoints"]]
+    rows.append(("total", before["total"], after["total"]))
+    for label, old, new in rows:
+        cells = []
+        for metric in ("p50_ms", "p95_ms", "rps"):
+            change = 100 * (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            cells.append(f"{new[metric]:8.2f} {change:+6.1f}%")
+        print(f"{label:40} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16}")
+        if old["p95_ms"] and 100 * (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] > args.threshold:
+            regressions += 1
+    if regressions:
+        print(f"\n{regressions} endpoint(s) con p95 más de {args.threshold}% peor")
+    return 1 if regressions else 0
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--surveys", type=int, default=100, help="Cantidad de encuestas")
+    parser.add_argument("--questions", type=int, default=8, help="Preguntas por encuesta")
+    parser.add_argument("--answers", type=int, default=20, help="Respuestas por encuesta")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos y de la mezcla")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark de la API de encuestas")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Ejecuta la mezcla de peticiones y guarda los resultados")
+    add_dataset_arguments(run_parser)
+    run_parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess")
+    run_parser.add_argument("--url", default="http://localhost:5002", help="Servidor para --target http")
+    run_parser.add_argument("--mongo", choices=["mongomock", "real"], default="mongomock")
+    run_parser.add_argument("--redis", choices=["fakeredis", "real"], default="fakeredis")
+    run_parser.add_argument("--requests", type=int, default=2000, help="Peticiones medidas")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Hilos cliente")
+    run_parser.add_argument("--warmup", type=int, default=20, help="Peticiones sin medir por hilo")
+    run_parser.add_argument("--weight", action="append", default=[], help="Peso de un endpoint: 'GET /surveys/<id>=10'")
+    run_parser.add_argument("--include-errors", action="store_true", help="Incluye los casos de error de la colección")
+    run_parser.add_argument("--collection", default=COLLECTION, help="Colección de Postman")
+    run_parser.add_argument("--output", help="Archivo de resultados (por defecto bench/results/<fecha>-<commit>.json)")
+    run_parser.set_defaults(func=cmd_run)
+
+    generate_parser = commands.add_parser("generate", help="Escribe los datos en JSONL para `manage.py seed`")
+    add_dataset_arguments(generate_parser)
+    generate_parser.add_argument("--output-dir", default=os.path.join(ROOT, "bench", "data"))
+    generate_parser.set_defaults(func=cmd_generate)
+
+    compare_parser = commands.add_parser("compare", help="Compara dos resultados")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Regresión de p95 tolerada (%%)")
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Backends del benchmark en proceso y conteo de idas y vueltas por endpoint.
+
+Con las sustituciones (mongomock, fakeredis) no se necesita ningún
+servidor: las sesiones de los tokens se dejan en Redis, así que PostgreSQL
+no se consulta durante la prueba.
+"""
+import functools
+import os
+import tempfile
+import threading
+from collections import defaultdict
+
+_local = threading.local()
+_lock = threading.Lock()
+round_trips = defaultdict(lambda: defaultdict(int))
+
+# Tokens de la colección: 1 administrador, 2 creador, 3 encuestado
+SESSIONS = {1: (1, 1, True), 2: (2, 2, True), 3: (3, 3, True)}
+
+MONGOMOCK_METHODS = [
+    "find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "find_one_and_update", "aggregate", "bulk_write", "distinct",
+    "count_documents",
+]
+
+
+def set_label(label):
+    _local.label = label
+
+
+def count(backend):
+    label = getattr(_local, "label", None)
+    if label is None:
+        return
+    with _lock:
+        round_trips[label][backend] += 1
+
+
+def reset():
+    with _lock:
+        round_trips.clear()
+
+
+def instrument_redis():
+    import redis.client
+
+    execute_command = redis.client.Redis.execute_command
+    execute = redis.client.Pipeline.execute
+
+    @functools.wraps(execute_command)
+    def counted_command(self, *args, **kwargs):
+        count("redis")
+        return execute_command(self, *args, **kwargs)
+
+    @functools.wraps(execute)
+    def counted_pipeline(self, *args, **kwargs):
+        count("redis")
+        return execute(self, *args, **kwargs)
+
+    redis.client.Redis.execute_command = counted_command
+    redis.client.Pipeline.execute = counted_pipeline
+
+
+def instrument_mongo():
+    from pymongo import monitoring
+
+    class Listener(monitoring.CommandListener):
+        # Los eventos se publican en el hilo que hace la operación
+        def started(self, event):
+            count("mongo")
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    monitoring.register(Listener())
+
+
+def instrument_mongomock():
+    # mongomock no publica eventos de monitoreo: se cuenta cada operación
+    # de colección una vez (find cuenta como una sola ida y vuelta)
+    from mongomock.collection import Collection
+
+    def wrap(method):
+        @functools.wraps(method)
+        def counted(self, *args, **kwargs):
+            depth = getattr(_local, "depth", 0)
+            if not depth:
+                count("mongo")
+            _local.depth = depth + 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                _local.depth = depth
+        return counted
+
+    for name in MONGOMOCK_METHODS:
+        setattr(Collection, name, wrap(getattr(Collection, name)))
+
+
+def instrument_postgres():
+    import pg_pool
+
+    class CountedCursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, *args, **kwargs):
+            count("postgres")
+            return self._cursor.execute(*args, **kwargs)
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+    cursor = pg_pool.PostgresPool.cursor
+
+    @functools.wraps(cursor)
+    def counted_cursor(self, *args, **kwargs):
+        context = cursor(self, *args, **kwargs)
+
+        class Context:
+            def __enter__(self):
+                return CountedCursor(context.__enter__())
+
+            def __exit__(self, *exc):
+                return context.__exit__(*exc)
+
+        return Context()
+
+    pg_pool.PostgresPool.cursor = counted_cursor
+
+
+def in_process_app(surveys, answers, mongo="mongomock", redis_backend="fakeredis"):
+    """
+    Importa app.py con los backends pedidos, carga los datos con el mismo
+    cargador que `manage.py seed` y devuelve el módulo `app`.
+    """
+    from bench import dataset
+
+    os.environ["INICIO_DIFERIDO"] = "1"
+    os.environ.setdefault("DB_NAME", "encuestas")
+    # Sin conexiones de PostgreSQL al arrancar y sesiones que no vencen durante la prueba
+    os.environ.setdefault("PG_POOL_MIN", "0")
+    os.environ.setdefault("AUTH_CACHE_REDIS_TTL", str(7 * 24 * 3600))
+
+    import app
+    import db as db_module
+
+    instrument_redis()
+    instrument_postgres()
+    if mongo == "mongomock":
+        import mongomock
+        instrument_mongomock()
+        db_module.MongoClient = mongomock.MongoClient
+    else:
+        instrument_mongo()
+    if redis_backend == "fakeredis":
+        import fakeredis
+        server = fakeredis.FakeServer()
+        app.redis.Redis = functools.partial(fakeredis.FakeRedis, server=server)
+    app.init_backends()
+
+    database = app.db
+    database.create_indexes()
+    with tempfile.TemporaryDirectory() as directory:
+        surveys_path = os.path.join(directory, "bench_surveys.jsonl")
+        answers_path = os.path.join(directory, "bench_answers.jsonl")
+        dataset.write_jsonl(surveys_path, surveys)
+        dataset.write_jsonl(answers_path, answers)
+        database.insert_surveys_mongodb(surveys_path)
+        database.insert_answers_mongodb(answers_path)
+    database.rebuild_statistics()
+    for token, session in SESSIONS.items():
+        database.token_cache.set(token, session)
+    return app
@@ -0,0 +1,131 @@
+"""Mezcla de peticiones derivada de la colección de Postman."""
+import copy
+import itertools
+import json
+import math
+import re
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+Template = namedtuple("Template", ["name", "method", "label", "body"])
+
+# Peso relativo de cada endpoint. Los borrados quedan en 0 porque cambian
+# los datos que usan las demás peticiones; se activan con --weight.
+DEFAULT_WEIGHTS = {
+    "GET /surveys/page=<n>": 15,
+    "GET /surveys/<id>": 30,
+    "GET /surveys/<id>/questions": 25,
+    "POST /surveys/<id>/responses": 20,
+    "GET /surveys/<id>/responses": 2,
+    "GET /surveys/<id>/analysis": 2,
+    "POST /surveys": 1,
+    "PUT /surveys/<id>": 1,
+    "POST /surveys/<id>/publish": 1,
+    "POST /surveys/<id>/questions": 1,
+    "PUT /surveys/<id>/questions/<n>": 1,
+    "DELETE /surveys/<id>": 0,
+    "DELETE /surveys/<id>/questions/<n>": 0,
+    "POST /respondents": 0,
+}
+
+# Endpoints que no están en la colección
+EXTRA_TEMPLATES = [
+    Template("analysis", "GET", "GET /surveys/<id>/analysis", None),
+]
+
+PAGE_SIZE = 10
+
+
+def label(method, path):
+    segments = []
+    for segment in path.strip("/").split("/"):
+        if segment.isdigit():
+            segment = "<n>" if segments and segments[-1] == "questions" else "<id>"
+        segment = re.sub(r"=\d+$", "=<n>", segment)
+        segments.append(segment)
+    return f"{method} /{'/'.join(segments)}"
+
+
+def load(path, include_errors=False):
+    """Plantillas de la colección (una por endpoint); las de error se omiten."""
+    with open(path) as file:
+        collection = json.load(file)
+    templates = {}
+    for item in _requests(collection["item"]):
+        if "(error)" in item["name"] and not include_errors:
+            continue
+        request = item["request"]
+        url = request["url"]["raw"] if isinstance(request["url"], dict) else request["url"]
+        method = request["method"]
+        raw = request.get("body", {}).get("raw")
+        body = json.loads(raw) if raw and method != "GET" else None
+        templates.setdefault(label(method, urlsplit(url).path), Template(item["name"], method, label(method, urlsplit(url).path), body))
+    for template in EXTRA_TEMPLATES:
+        templates.setdefault(template.label, template)
+    return list(templates.values())
+
+
+def _requests(items):
+    for item in items:
+        if "item" in item:
+            yield from _requests(item["item"])
+        else:
+            yield item
+
+
+class Mix:
+    """Elige peticiones según los pesos y las llena con datos del conjunto generado."""
+
+    def __init__(self, templates, weights, surveys, generator, new_numbers):
+        active = [template for template in templates if weights.get(template.label, 1) > 0]
+        if not active:
+            raise ValueError("No endpoint has a positive weight")
+        self.templates = active
+        self.weights = [weights.get(template.label, 1) for template in active]
+        self.surveys = surveys
+        self.generator = generator
+        self.rnd = generator.rnd
+        self.new_numbers = new_numbers
+        self.pages = max(1, math.ceil(len(surveys) / PAGE_SIZE))
+
+    def next(self):
+        template = self.rnd.choices(self.templates, self.weights)[0]
+        survey = self.rnd.choice(self.surveys)
+        question = self.rnd.choice(survey["Preguntas"])
+        path = template.label.split(" ", 1)[1]
+        path = path.replace("page=<n>", f"page={self.rnd.randint(1, self.pages)}")
+        path = path.replace("<id>", str(survey["NumeroEncuesta"])).replace("<n>", str(question["Numero"]))
+        return template.label, template.method, path, self.body(template, survey, question)
+
+    def body(self, template, survey, question):
+        if template.label == "POST /surveys/<id>/responses":
+            answer = self.generator.answer(survey)
+            answer["Token"] = 3
+            return answer
+        if template.label == "POST /surveys":
+            body = self.generator.survey(next(self.new_numbers), len(survey["Preguntas"]))
+            body["Token"] = body["IdAutor"]
+            return body
+        if template.label == "PUT /surveys/<id>":
+            # Misma encuesta con otro título: las preguntas no cambian
+            body = dict(copy.deepcopy(survey), Titulo=self.generator.fake.sentence())
+            body["Token"] = survey["IdAutor"]
+            return body
+        if template.label == "PUT /surveys/<id>/questions/<n>":
+            # Se cambia solo el texto para que las respuestas generadas sigan siendo válidas
+            updated = dict(question, Pregunta=self.generator.fake.sentence())
+            return {"Token": survey["IdAutor"], "IdAutor": survey["IdAutor"], "Preguntas": [updated]}
+        if template.body is None:
+            return None
+        body = copy.deepcopy(template.body)
+        if "Token" in body:
+            body["Token"] = survey["IdAutor"]
+            body["IdAutor"] = survey["IdAutor"]
+        if "NumeroEncuesta" in body:
+            body["NumeroEncuesta"] = survey["NumeroEncuesta"]
+        return body
+
+
+def new_numbers(surveys):
+    # Números libres para las encuestas que se crean durante la prueba
+    return itertools.count(max(survey["NumeroEncuesta"] for survey in surveys) + 1)
@@ -0,0 +1,40 @@
+"""Datos sintéticos para el benchmark: encuestas × preguntas × respuestas."""
+import json
+import random
+
+from faker import Faker
+
+import generate_answers as ga
+import generate_questions as gq
+
+
+class Generator:
+    """Generador determinista: la misma semilla produce los mismos datos."""
+
+    def __init__(self, seed=0):
+        self.rnd = random.Random(seed)
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+
+    def survey(self, number, questions):
+        return gq.generate_survey(number, questions, self.rnd, self.fake)
+
+    def answer(self, survey):
+        return ga.generate_answer(survey, self.rnd.choice(ga.jsonEncuestadosInfo), self.rnd, self.fake)
+
+
+def generate(surveys=100, questions=8, answers=20, seed=0):
+    """Devuelve las encuestas y un iterador con `answers` respuestas por encuesta."""
+    generator = Generator(seed)
+    survey_docs = [generator.survey(number, questions) for number in range(1, surveys + 1)]
+    answer_docs = (generator.answer(survey) for survey in survey_docs for _ in range(answers))
+    return survey_docs, answer_docs
+
+
+def write_jsonl(path, documents):
+    count = 0
+    with open(path, "w") as file:
+        for document in documents:
+            file.write(json.dumps(document) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,150 @@
+"""Ejecución de la mezcla de peticiones y cálculo de latencias."""
+import http.client
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from bench import backends
+
+
+class InProcessTarget:
+    """Peticiones con el cliente de pruebas de Flask, sin red de por medio."""
+
+    def __init__(self, app_module):
+        self.app = app_module.app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            response.get_data()  # consume las respuestas transmitidas
+            return response.status_code
+
+        return send
+
+
+class HttpTarget:
+    """Peticiones HTTP con conexiones persistentes, una por hilo."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    def session(self):
+        state = {"connection": None}
+
+        def send(method, path, body):
+            if state["connection"] is None:
+                state["connection"] = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            payload = json.dumps(body) if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload is not None else {}
+            try:
+                state["connection"].request(method, path, body=payload, headers=headers)
+                response = state["connection"].getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                state["connection"].close()
+                state["connection"] = None
+                raise
+
+        return send
+
+
+def run(target, make_mix, requests, concurrency, warmup=0):
+    """
+    Reparte `requests` peticiones entre `concurrency` hilos; cada hilo usa
+    su propia mezcla (`make_mix(índice)`) y descarta sus primeras `warmup`.
+    Devuelve las muestras {endpoint: [(segundos, estado)]} y la duración.
+    """
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    per_thread = [requests // concurrency + (1 if index < requests % concurrency else 0)
+                  for index in range(concurrency)]
+    start_barrier = threading.Barrier(concurrency + 1)
+    measured = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        mix = make_mix(index)
+        send = target.session()
+        local = defaultdict(list)
+        for _ in range(warmup):
+            _, method, path, body = mix.next()
+            _send(send, method, path, body)
+        start_barrier.wait()
+        for _ in range(per_thread[index]):
+            label, method, path, body = mix.next()
+            backends.set_label(label)
+            begin = time.perf_counter()
+            status = _send(send, method, path, body)
+            local[label].append((time.perf_counter() - begin, status))
+            backends.set_label(None)
+        measured.wait()
+        with lock:
+            for label, values in local.items():
+                samples[label].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    backends.reset()
+    start_barrier.wait()
+    begin = time.perf_counter()
+    measured.wait()
+    elapsed = time.perf_counter() - begin
+    for thread in threads:
+        thread.join()
+    return samples, elapsed
+
+
+def _send(send, method, path, body):
+    try:
+        return send(method, path, body)
+    except Exception:
+        return 0  # sin respuesta
+
+
+def percentile(sorted_values, fraction):
+    # Rango más cercano
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed, round_trips=None):
+    endpoints = {}
+    for label, values in sorted(samples.items()):
+        latencies = sorted(seconds for seconds, _ in values)
+        statuses = defaultdict(int)
+        for _, status in values:
+            statuses[str(status)] += 1
+        summary = {
+            "requests": len(values),
+            "errors": sum(1 for _, status in values if status == 0 or status >= 500),
+            "statuses": dict(statuses),
+            "rps": len(values) / elapsed if elapsed else 0.0,
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            "p50_ms": 1000 * percentile(latencies, 0.50),
+            "p95_ms": 1000 * percentile(latencies, 0.95),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+        }
+        if round_trips is not None:
+            summary["round_trips"] = {backend: count / len(values)
+                                      for backend, count in sorted(round_trips.get(label, {}).items())}
+        endpoints[label] = summary
+    latencies = sorted(seconds for values in samples.values() for seconds, _ in values)
+    total = {
+        "requests": len(latencies),
+        "errors": sum(summary["errors"] for summary in endpoints.values()),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "elapsed_s": elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+    return {"total": total, "endpoints": endpoints}
@@ -0,0 +1,449 @@
+import asyncio
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from serialization import dumps
+
+Entry = namedtuple("Entry", ["body", "headers"])
+
+INVALIDATION_CHANNEL = "cache:invalidaciones"
+
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LocalCache:
+    """
+    LRU en memoria con los cuerpos ya codificados en bytes. El TTL acota
+    cuánto puede servirse una entrada si se pierde una invalidación.
+    """
+
+    def __init__(self, maxsize=1000, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Sube con cada invalidación; evita guardar lo leído antes de una
+        self.generation = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            expires, entry = cached
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Cache:
+    """
+    Caché de respuestas JSON en Redis. Cada llave es un hash con el cuerpo
+    ya serializado (bytes listos para enviar si el cliente no decodifica), los encabezados, cuándo vence y cuánto tardó en
+    calcularse. Al faltar una llave solo un proceso la recalcula (candado
+    en Redis) mientras los demás esperan el resultado; antes de vencer se
+    refresca de forma probabilística (XFetch) para que no expiren todas a
+    la vez, y los "no encontrado" se guardan con `negative_ttl`.
+
+    Con `local` las lecturas marcadas se sirven primero desde un LocalCache
+    del proceso; las invalidaciones se publican en INVALIDATION_CHANNEL y
+    `listen()` las aplica en cada proceso, y también las pasa a los
+    `subscribe(handler)` (validadores, sesiones). Si se indica, `on_serialize(segundos)`
+    recibe lo que tardó cada serialización de un cuerpo.
+    """
+
+    def __init__(self, redis_client, negative_ttl=60, lock_timeout=10, wait_timeout=5, beta=1.0, local=None,
+                 on_serialize=None):
+        self.redis = redis_client
+        self.local = local
+        self.on_serialize = on_serialize
+        self._handlers = []
+        self._listener = None
+        self.negative_ttl = negative_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.beta = beta
+        self._release_lock = redis_client.register_script(_RELEASE_LOCK)
+        self._local_locks = {}
+        self._local_locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "misses": 0, "negative_hits": 0, "early_refreshes": 0,
+            "local_hits": 0, "lock_waits": 0, "loads": 0, "load_seconds": 0.0, "fetches": 0, "fetch_seconds": 0.0,
+        }
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def metrics(self):
+        with self._stats_lock:
+            metrics = dict(self.stats)
+        if self.local is not None:
+            metrics["local_size"] = len(self.local)
+        return metrics
+
+    def subscribe(self, handler):
+        """
+        `handler(llaves)` recibe las llaves de cada invalidación publicada en
+        INVALIDATION_CHANNEL, o None si pudo perderse alguna. Antes de listen().
+        """
+        self._handlers.append(handler)
+
+    def listen(self):
+        """Aplica en este proceso las invalidaciones publicadas por los demás."""
+        if (self.local is None and not self._handlers) or self._listener is not None:
+            return
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True,
+                                              exception_handler=self._on_listener_error)
+
+    def _on_invalidation(self, message):
+        self._apply(_to_str(message["data"]).split("\n"))
+
+    def _apply(self, keys):
+        # keys None: se pudo perder alguna invalidación y se descarta todo lo local
+        if self.local is not None:
+            if keys is None:
+                self.local.clear()
+            else:
+                self.local.invalidate(keys)
+        for handler in self._handlers:
+            handler(keys)
+
+    def _on_listener_error(self, error, pubsub, thread):
+        self._apply(None)
+        time.sleep(1)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def version(self, namespace):
+        """Generación actual de `namespace`; va dentro de sus llaves."""
+        return int(self.redis.get(f"{namespace}:version") or 0)
+
+    def invalidate(self, keys=(), namespaces=()):
+        """
+        Borra `keys` y sube la generación de `namespaces` en una sola
+        transacción; las llaves de generaciones anteriores quedan sin uso
+        y vencen solas.
+        """
+        keys = list(keys)
+        if self.local is not None:
+            self.local.invalidate(keys)
+        self._invalidation(keys, namespaces).execute()
+
+    def fetch(self, key, loader, ttl, headers=None, local=False):
+        """
+        Devuelve un Entry con el cuerpo JSON de `key`, o None si `loader`
+        devolvió None (no encontrado). `headers(valor)` calcula encabezados
+        que se guardan junto con el cuerpo. Con `local` se usa también el
+        LocalCache del proceso.
+        """
+        if local and self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                self._count(local_hits=1, fetches=1)
+                return entry
+            generation = self.local.generation
+            entry = self._fetch(key, loader, ttl, headers)
+            if entry is not None:
+                self.local.set(key, Entry(_to_bytes(entry.body), entry.headers), generation)
+            return entry
+        return self._fetch(key, loader, ttl, headers)
+
+    def _fetch(self, key, loader, ttl, headers):
+        start = time.monotonic()
+        try:
+            cached = self._read(key)
+            if cached and not self._should_refresh(cached):
+                return self._hit(cached)
+            if cached:
+                # Refresco anticipado: lo hace quien consiga el candado, los demás usan lo guardado
+                entry = self._load_locked(key, loader, ttl, headers, wait=False)
+                if entry is False:
+                    return self._hit(cached)
+                self._count(early_refreshes=1)
+                return entry
+            self._count(misses=1)
+            return self._load_locked(key, loader, ttl, headers, wait=True)
+        finally:
+            self._count(fetches=1, fetch_seconds=time.monotonic() - start)
+
+    def _read(self, key):
+        # Con un cliente en bytes solo se decodifican los nombres; el cuerpo queda en bytes
+        return {_to_str(field): value for field, value in self.redis.hgetall(key).items()}
+
+    def _hit(self, cached):
+        if cached.get("faltante"):
+            self._count(negative_hits=1)
+            return None
+        self._count(hits=1)
+        return Entry(cached["cuerpo"], _decode_headers(cached.get("encabezados", "")))
+
+    def _should_refresh(self, cached):
+        delta = float(cached.get("delta", 0))
+        expires = float(cached.get("vence", 0))
+        return time.time() - delta * self.beta * math.log(random.random() or 1e-12) >= expires
+
+    def _local_lock(self, key):
+        with self._local_locks_guard:
+            return self._local_locks.setdefault(key, threading.Lock())
+
+    def _load_locked(self, key, loader, ttl, headers, wait):
+        local_lock = self._local_lock(key)
+        if not local_lock.acquire(blocking=wait):
+            return False
+        try:
+            if wait:
+                # Otro hilo de este proceso pudo haberla cargado mientras esperábamos
+                cached = self._read(key)
+                if cached:
+                    return self._hit(cached)
+            token = uuid.uuid4().hex
+            lock_key = f"lock:{key}"
+            while not self.redis.set(lock_key, token, nx=True, ex=self.lock_timeout):
+                if not wait:
+                    return False
+                cached = self._wait_for(key)
+                if cached:
+                    return self._hit(cached)
+            try:
+                return self._load(key, loader, ttl, headers)
+            finally:
+                self._release_lock(keys=[lock_key], args=[token])
+        finally:
+            local_lock.release()
+            with self._local_locks_guard:
+                if not local_lock.locked():
+                    self._local_locks.pop(key, None)
+
+    def _wait_for(self, key):
+        # Espera a que el proceso con el candado guarde el valor
+        self._count(lock_waits=1)
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            cached = self._read(key)
+            if cached:
+                return cached
+            delay = min(delay * 2, 0.2)
+        return None
+
+    def _load(self, key, loader, ttl, headers):
+        start = time.monotonic()
+        value = loader()
+        entry, fields, expire = self._entry(value, time.monotonic() - start, ttl, headers)
+        self._store(key, fields, expire).execute()
+        return entry
+
+    def _entry(self, value, delta, ttl, headers):
+        # Entry y campos del hash para lo que devolvió el loader
+        self._count(loads=1, load_seconds=delta)
+        if value is None:
+            fields = {"faltante": "1", "delta": delta, "vence": time.time() + self.negative_ttl}
+            return None, fields, self.negative_ttl
+        start = time.perf_counter()
+        body = dumps(value)
+        if self.on_serialize is not None:
+            self.on_serialize(time.perf_counter() - start)
+        entry = Entry(body, headers(value) if headers else {})
+        fields = {"cuerpo": entry.body, "encabezados": _encode_headers(entry.headers),
+                  "delta": delta, "vence": time.time() + ttl}
+        return entry, fields, ttl
+
+    def _store(self, key, fields, expire):
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, expire)
+        return pipe
+
+    def _invalidation(self, keys, namespaces):
+        pipe = self.redis.pipeline(transaction=True)
+        for namespace in namespaces:
+            pipe.incr(f"{namespace}:version")
+        if keys:
+            pipe.delete(*keys)
+            if self.local is not None:
+                pipe.publish(INVALIDATION_CHANNEL, "\n".join(keys))
+        return pipe
+
+
+class AsyncCache(Cache):
+    """
+    Cache sobre redis.asyncio para el modo ASGI: mismas llaves, formato e
+    invalidaciones que Cache, con loaders asíncronos y candados de asyncio
+    en lugar de hilos.
+    """
+
+    async def listen(self):
+        if (self.local is None and not self._handlers) or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_invalidation(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._apply(None)
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def version(self, namespace):
+        return int(await self.redis.get(f"{namespace}:version") or 0)
+
+    async def invalidate(self, keys=(), namespaces=()):
+        keys = list(keys)
+        if self.local is not None:
+            self.local.invalidate(keys)
+        await self._invalidation(keys, namespaces).execute()
+
+    async def fetch(self, key, loader, ttl, headers=None, local=False):
+        if local and self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                self._count(local_hits=1, fetches=1)
+                return entry
+            generation = self.local.generation
+            entry = await self._fetch(key, loader, ttl, headers)
+            if entry is not None:
+                self.local.set(key, Entry(_to_bytes(entry.body), entry.headers), generation)
+            return entry
+        return await self._fetch(key, loader, ttl, headers)
+
+    async def _fetch(self, key, loader, ttl, headers):
+        start = time.monotonic()
+        try:
+            cached = await self._read(key)
+            if cached and not self._should_refresh(cached):
+                return self._hit(cached)
+            if cached:
+                entry = await self._load_locked(key, loader, ttl, headers, wait=False)
+                if entry is False:
+                    return self._hit(cached)
+                self._count(early_refreshes=1)
+                return entry
+            self._count(misses=1)
+            return await self._load_locked(key, loader, ttl, headers, wait=True)
+        finally:
+            self._count(fetches=1, fetch_seconds=time.monotonic() - start)
+
+    async def _read(self, key):
+        return {_to_str(field): value for field, value in (await self.redis.hgetall(key)).items()}
+
+    async def _load_locked(self, key, loader, ttl, headers, wait):
+        # [candado, corrutinas que lo usan]; se descarta cuando nadie lo usa
+        local_lock = self._local_locks.setdefault(key, [asyncio.Lock(), 0])
+        if not wait and local_lock[0].locked():
+            return False
+        local_lock[1] += 1
+        try:
+            async with local_lock[0]:
+                if wait:
+                    cached = await self._read(key)
+                    if cached:
+                        return self._hit(cached)
+                token = uuid.uuid4().hex
+                lock_key = f"lock:{key}"
+                while not await self.redis.set(lock_key, token, nx=True, ex=self.lock_timeout):
+                    if not wait:
+                        return False
+                    cached = await self._wait_for(key)
+                    if cached:
+                        return self._hit(cached)
+                try:
+                    return await self._load(key, loader, ttl, headers)
+                finally:
+                    await self._release_lock(keys=[lock_key], args=[token])
+        finally:
+            local_lock[1] -= 1
+            if not local_lock[1]:
+                self._local_locks.pop(key, None)
+
+    async def _wait_for(self, key):
+        self._count(lock_waits=1)
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            cached = await self._read(key)
+            if cached:
+                return cached
+            delay = min(delay * 2, 0.2)
+        return None
+
+    async def _load(self, key, loader, ttl, headers):
+        start = time.monotonic()
+        value = await loader()
+        entry, fields, expire = self._entry(value, time.monotonic() - start, ttl, headers)
+        await self._store(key, fields, expire).execute()
+        return entry
+
+
+def _to_bytes(body):
+    return body.encode() if isinstance(body, str) else body
+
+
+def _to_str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _encode_headers(headers):
+    return "\n".join(f"{name}: {value}" for name, value in headers.items())
+
+
+def _decode_headers(encoded):
+    encoded = _to_str(encoded)
+    return dict(line.split(": ", 1) for line in encoded.split("\n") if line)
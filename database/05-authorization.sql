@@ -0,0 +1,15 @@
+-- SP - Autorización
+\connect encuestas postgres
+
+-- Obtener la sesión de un token: usuario, rol y si sigue activa
+CREATE OR REPLACE FUNCTION OBTENER_SESION(tokenSesion integer)
+  RETURNS TABLE (id integer, idRol integer, activo boolean)
+  LANGUAGE plpgsql AS
+$func$
+BEGIN
+   RETURN QUERY
+   SELECT U.id, U.idRol, L.FechaLogOut IS NULL
+   FROM Logs AS L INNER JOIN Usuarios AS U ON L.IdUsuario = U.id
+   WHERE L.Token = tokenSesion;
+END
+$func$;
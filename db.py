@@ -1,30 +1,173 @@
-from pymongo import MongoClient
-from flask import request, jsonify
+from pymongo import MongoClient, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from flask import request, g, has_request_context
 from bson import ObjectId
 from datetime import datetime
+from collections.abc import Hashable
 from json_schemas import survey_schema, answer_schema
-import psycopg2
-import json
+from config import SEED_BATCH_SIZE, SCHEMA_VERSION, RESPONSES_BATCH_SIZE, PG_POOL_MIN, PG_POOL_MAX, PG_POOL_TIMEOUT
+from config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_CACHE_REDIS_TTL, SURVEY_VALIDATOR_TTL
+from pg_pool import PostgresPool
+from token_cache import TokenCache
+from instrumentation import record
+from cache import INVALIDATION_CHANNEL
+import authorization
+import ingestion
+from validation import compile_schema, compile_survey, missing_survey, ValidatorCache
+import analytics
+import os
+import seed
+
+answer_validator = compile_schema(answer_schema)
+
+# Funciones de PostgreSQL que usa la API. Los scripts de database/ solo se
+# ejecutan con el volumen vacío; `manage.py bootstrap` los vuelve a aplicar.
+SQL_FUNCTIONS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "05-authorization.sql")]
+
+OWNER_PROJECTION = {"_id": 0, "NumeroEncuesta": 1, "IdAutor": 1}
+
+
+def survey_owner_query(num_encuesta, idAutor):
+    return {"NumeroEncuesta": num_encuesta, "IdAutor": idAutor}
+
+
+def highest_question_number(questions):
+    numbers = [question.get("Numero") for question in questions or [] if isinstance(question, dict)]
+    return max((number for number in numbers if isinstance(number, int)), default=0)
+
+
+def prepare_bulk_rows(id, rows, validator):
+    """
+    Valida las filas de una carga masiva de la encuesta `id`. Devuelve las
+    respuestas válidas, su número de fila y los errores por fila.
+    """
+    errors = []
+    answers, row_numbers = [], []
+    for number, row in enumerate(rows):
+        if isinstance(row, Exception):
+            errors.append({"Fila": number, "Errores": [f"invalid JSON: {row}"]})
+            continue
+        if not isinstance(row, dict):
+            errors.append({"Fila": number, "Errores": ["documento: must be object"]})
+            continue
+        row.pop('Token', None)
+        row.setdefault('NumeroEncuesta', id)
+        if row['NumeroEncuesta'] != id:
+            errors.append({"Fila": number, "Errores": [f"documento.NumeroEncuesta: must be {id}"]})
+            continue
+        try:
+            row['FechaRealizado'] = datetime.fromisoformat(row['FechaRealizado'])
+        except (KeyError, TypeError, ValueError):
+            pass  # lo reporta el validador
+        row_errors = validator(row)
+        if row_errors:
+            errors.append({"Fila": number, "Errores": row_errors})
+            continue
+        answers.append(row)
+        row_numbers.append(number)
+    return answers, row_numbers, errors
+
+
+def responses_query(id, after=None, desde=None, hasta=None):
+    query = {"NumeroEncuesta": id}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    if desde or hasta:
+        query["FechaRealizado"] = {}
+        if desde:
+            query["FechaRealizado"]["$gte"] = desde
+        if hasta:
+            query["FechaRealizado"]["$lt"] = hasta
+    return query
+
+
+def responses_projection(fields, limit, batch_size):
+    """
+    Valida los parámetros de iter_responses antes de crear el cursor: la
+    respuesta se transmite, así que un error al recorrerlo la dejaría cortada.
+    """
+    if batch_size < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit and batch_size must not be negative")
+    if fields and any(not field or field.startswith("$") for field in fields):
+        raise ValueError("Invalid fields")
+    return {field: 1 for field in fields} if fields else None
+
+
+def bulk_summary(answers, row_numbers, errors, write_errors):
+    for index, error in write_errors.items():
+        errors.append({"Fila": row_numbers[index], "Errores": [error['errmsg']]})
+    errors.sort(key=lambda error: error["Fila"])
+    return {"Insertadas": len(answers) - len(write_errors), "Rechazadas": len(errors), "Errores": errors}
+
+
+class MongoListener(monitoring.CommandListener):
+    # pymongo publica los eventos en el hilo que hace la operación
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record("mongo", event.duration_micros / 1e6)
+
 
 class Database:
+    # Índices declarados por colección: (llaves, opciones)
+    INDEXES = {
+        "encuestas": [
+            ([("NumeroEncuesta", 1)], {"unique": True}),
+            # Verificación de autor cubierta por el índice
+            ([("NumeroEncuesta", 1), ("IdAutor", 1)], {}),
+            # Encuestas públicas paginadas por NumeroEncuesta
+            ([("Disponible", 1), ("NumeroEncuesta", 1)], {}),
+        ],
+        "respuestas": [
+            # Respuestas de una encuesta, opcionalmente por rango de fechas
+            ([("NumeroEncuesta", 1), ("FechaRealizado", 1)], {}),
+            # Recorrido paginado de respuestas por _id
+            ([("NumeroEncuesta", 1), ("_id", 1)], {}),
+            ([("IdEncuestado", 1)], {}),
+        ],
+    }
+
     def __init__(
             self, database="db_name", host="db_host", user="db_user", 
-            password="db_pass", port="db_port", uri="mongodb:mongoadmin:mongosecretmongodb:27017/"):
+            password="db_pass", port="db_port", uri="mongodb:mongoadmin:mongosecretmongodb:27017/",
+            bootstrap=False, redis_client=None):
         
         # PostgreSQL
-        self.conn = psycopg2.connect(
+        self.pool = PostgresPool(
+            PG_POOL_MIN, PG_POOL_MAX, timeout=PG_POOL_TIMEOUT,
             database=database, host=host, user=user, password=password, port=port)
        
+        # Redis (caché de sesiones e ingesta asíncrona)
+        self.redis = redis_client
+        # Caché de sesiones por token
+        self.token_cache = TokenCache(redis_client, AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_CACHE_REDIS_TTL)
+
+        # Validadores de respuestas compilados por encuesta
+        self.validators = ValidatorCache(SURVEY_VALIDATOR_TTL)
+
         # MongoDB
-        self.client = MongoClient(uri)
+        self.client = MongoClient(uri, event_listeners=[MongoListener()])
         self.db = self.client[database]
 
-        self.encuestas = self.create_or_update_collection("encuestas", survey_schema)
-        self.encuestas.create_index([("NumeroEncuesta", 1)], unique=True)
-        self.respuestas = self.create_or_update_collection("respuestas", answer_schema)
+        self.encuestas = self.db["encuestas"]
+        self.respuestas = self.db["respuestas"]
+        self.carga_inicial = self.db["carga_inicial"]
+        self.migraciones = self.db["migraciones"]
+        self.contadores = self.db["contadores"]
+        self.estadisticas = self.db["estadisticas"]
+
+        # El esquema, los índices y los datos iniciales los prepara
+        # `python manage.py bootstrap`; los workers solo abren conexiones.
+        if bootstrap:
+            self.bootstrap()
 
-        self.insert_surveys_mongodb()
-        self.insert_answers_mongodb()
+    def close(self):
+        self.pool.close()
+        self.client.close()
 
     def create_or_update_collection(self, collection_name, schema):
         schema_for_db = {'validator': schema}  
@@ -34,101 +177,177 @@ class Database:
             self.db.command('collMod', collection_name, **schema_for_db)
         return self.db[collection_name]
 
+    # Migraciones
+    def schema_version(self):
+        marker = self.migraciones.find_one({"_id": "esquema"})
+        return marker["Version"] if marker else 0
+
+    def create_sql_functions(self):
+        for path in SQL_FUNCTIONS:
+            with open(path) as file:
+                # \connect es un comando de psql, no SQL
+                script = "".join(line for line in file if not line.startswith("\\"))
+            with self.pool.cursor() as cursor:
+                cursor.execute(script)
+
+    def bootstrap(self, force=False, seed_data=True):
+        # CREATE OR REPLACE: se aplica siempre, aunque el esquema de MongoDB esté al día
+        self.create_sql_functions()
+        if not force and self.schema_version() >= SCHEMA_VERSION:
+            return False
+        self.encuestas = self.create_or_update_collection("encuestas", survey_schema)
+        self.respuestas = self.create_or_update_collection("respuestas", answer_schema)
+        self.create_indexes()
+        if seed_data:
+            self.insert_surveys_mongodb()
+            self.insert_answers_mongodb()
+        self.rebuild_statistics()
+        self.migraciones.replace_one(
+            {"_id": "esquema"},
+            {"_id": "esquema", "Version": SCHEMA_VERSION, "Fecha": datetime.now()},
+            upsert=True
+        )
+        return True
+
+    @staticmethod
+    def index_name(keys):
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def create_indexes(self):
+        for collection_name, indexes in self.INDEXES.items():
+            for keys, options in indexes:
+                self.db[collection_name].create_index(keys, name=self.index_name(keys), **options)
+
+    def check_indexes(self):
+        """
+        Compara los índices declarados con los existentes usando $indexStats.
+        Por colección devuelve los índices faltantes, los que no se han usado
+        desde que arrancó el servidor y los que existen sin estar declarados.
+        """
+        report = {}
+        for collection_name, indexes in self.INDEXES.items():
+            declared = [self.index_name(keys) for keys, _ in indexes]
+            stats = {}
+            if collection_name in self.db.list_collection_names():
+                stats = {stat["name"]: stat for stat in self.db[collection_name].aggregate([{"$indexStats": {}}])}
+            report[collection_name] = {
+                "faltantes": [name for name in declared if name not in stats],
+                "sin_uso": [name for name, stat in stats.items() if name != "_id_" and stat["accesses"]["ops"] == 0],
+                "no_declarados": [name for name in stats if name != "_id_" and name not in declared],
+                "uso": {name: {"ops": stat["accesses"]["ops"], "desde": stat["accesses"]["since"]} for name, stat in stats.items()},
+            }
+        return report
+
     # Métodos
     # Insertar datos MongoDB
-    def insert_surveys_mongodb(self):
-        if self.encuestas.count_documents({}) == 0:
-            with open('data_surveys.jsonl', 'r') as file:
-                for line in file:
-                    data = json.loads(line)
-                    data['FechaCreacion'] = datetime.fromisoformat(data['FechaCreacion'])
-                    data['FechaActualizacion'] = datetime.fromisoformat(data['FechaActualizacion'])
-                    self.encuestas.insert_one(data)
-
-    def insert_answers_mongodb(self):
-        if self.respuestas.count_documents({}) == 0:
-            with open('data_answers.jsonl', 'r') as file:
-                for line in file:
-                    data = json.loads(line)
-                    data['FechaRealizado'] = datetime.fromisoformat(data['FechaRealizado'])
-                    self.respuestas.insert_one(data)
+    def insert_surveys_mongodb(self, path='data_surveys.jsonl', batch_size=SEED_BATCH_SIZE):
+        return seed.load_jsonl(self.encuestas, path, seed.SURVEY_DATE_FIELDS, self.carga_inicial, batch_size)
+
+    def insert_answers_mongodb(self, path='data_answers.jsonl', batch_size=SEED_BATCH_SIZE):
+        return seed.load_jsonl(self.respuestas, path, seed.ANSWER_DATE_FIELDS, self.carga_inicial, batch_size)
 
     # Verificar data
     def verify_author(self, idAutor):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id FROM Usuarios WHERE id = %s;", (idAutor,))
-        user = cursor.fetchone()
-        cursor.close()
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT id FROM Usuarios WHERE id = %s;", (idAutor,))
+            user = cursor.fetchone()
         return True if user else False
 
     # Verificar token
+    def get_session(self, token):
+        """
+        Devuelve (id de usuario, rol, sesión activa) para el token, o None
+        si no existe. Se resuelve desde la caché y solo se consulta la base
+        de datos cuando el token no está en ella.
+        """
+        if token is None:
+            return None
+        session = self.token_cache.get(token)
+        if session:
+            return session
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT id, idRol, activo FROM OBTENER_SESION(%s);", (token,))
+            user = cursor.fetchone()
+        if not user:
+            return None
+        session = (user[0], user[1], user[2])
+        self.token_cache.set(token, session)
+        return session
+
     def get_token(self, token):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT U.idRol FROM Logs AS L INNER JOIN Usuarios AS U ON L.IdUsuario = U.id WHERE L.Token = %s;", (token,))
-        user = cursor.fetchone()
-        cursor.close()
-        return user[0] if user else 0
+        session = self.get_session(token)
+        return session[1] if session else 0
     
     def verify_token_admin(self, token):
         return self.get_token(token) == 1
     
     def verify_token_active(self, token):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT U.id FROM Logs AS L INNER JOIN Usuarios AS U ON L.IdUsuario = U.id WHERE L.Token = %s AND L.FechaLogOut IS NULL;", (token,))
-        user = cursor.fetchone()
-        cursor.close()
-        return True if user else False
+        session = self.get_session(token)
+        return True if session and session[2] else False
     
     def verify_token_create_surveys(self, token):
         return self.get_token(token) in [1, 2]
     
     def verify_token_user(self, idAutor, token):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT U.id, U.idRol FROM Logs AS L INNER JOIN Usuarios AS U ON L.IdUsuario = U.id WHERE L.Token = %s AND U.id = %s AND L.FechaLogOut IS NULL;", (token, idAutor))
-        user = cursor.fetchone()
-        cursor.close()
-        return user if user else None
+        session = self.get_session(token)
+        if session and session[2] and session[0] == idAutor:
+            return (session[0], session[1])
+        return None
 
     def verify_token_creator_survey(self, idAutor, num_encuesta, token):
-        user = self.verify_token_user(idAutor, token)
-        author = self.verify_author(idAutor)
-        if not user or not author:
-            return False 
-        if user[1] == 1:
-            return True
-        elif user[1] == 2:
-            survey = self.encuestas.find_one({"NumeroEncuesta": num_encuesta, "IdAutor": idAutor})
-            return survey["IdAutor"] == user[0]
-        return False
+        return self.authorize_survey(idAutor, num_encuesta, token)
+
+    def authorize_survey(self, idAutor, num_encuesta, token):
+        """
+        Decide si el token de idAutor puede modificar la encuesta: los
+        administradores siempre, los creadores solo sus propias encuestas.
+        La decisión se guarda en `g` para reutilizarla durante la petición.
+        """
+        if not isinstance(num_encuesta, Hashable):
+            return self._authorize_survey(idAutor, num_encuesta, token)
+        key = (str(token), idAutor, num_encuesta)
+        decisions = g.setdefault('autorizaciones', {}) if has_request_context() else {}
+        if key not in decisions:
+            decisions[key] = self._authorize_survey(idAutor, num_encuesta, token)
+        return decisions[key]
+
+    def _authorize_survey(self, idAutor, num_encuesta, token):
+        # Consulta cubierta por el índice (NumeroEncuesta, IdAutor)
+        return authorization.decide_survey(
+            self.get_session(token), idAutor,
+            lambda: self.encuestas.find_one(survey_owner_query(num_encuesta, idAutor), OWNER_PROJECTION) is not None)
 
     # Autenticación y Autorización
     def insert_user(self, user_data):
-        cursor = self.conn.cursor()
-        cursor.execute(
-            f"CALL INSERTAR_USUARIO('{user_data['Nombre']}', '{user_data['idRol']}', '{user_data['Correo']}', '{user_data['Contrasenna']}', '{user_data['FechaCreacion']}', '{user_data['FechaNacimiento']}', '{user_data['Genero']}', '{user_data['idPais']}');"
-        )   
-        self.conn.commit()
-        cursor.close()
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                f"CALL INSERTAR_USUARIO('{user_data['Nombre']}', '{user_data['idRol']}', '{user_data['Correo']}', '{user_data['Contrasenna']}', '{user_data['FechaCreacion']}', '{user_data['FechaNacimiento']}', '{user_data['Genero']}', '{user_data['idPais']}');"
+            )   
 
     def login_user(self, user_data):
-        cursor = self.conn.cursor()
         token = None
         fecha = datetime.now()
-        cursor.execute(
-            "CALL LOGIN_USUARIO(%s, %s, %s, %s);",
-            (user_data['Correo'], user_data['Contrasenna'], fecha, token)
-        )
-        # Obtener el valor de salida actualizado
-        token = cursor.fetchone()[0]
-        cursor.close()
+        with self.pool.cursor() as cursor:
+            cursor.execute(
+                "CALL LOGIN_USUARIO(%s, %s, %s, %s);",
+                (user_data['Correo'], user_data['Contrasenna'], fecha, token)
+            )
+            # Obtener el valor de salida actualizado
+            token = cursor.fetchone()[0]
         return token   
 
+    def logout_user(self, token):
+        with self.pool.cursor() as cursor:
+            cursor.execute("UPDATE Logs SET FechaLogOut = NOW() WHERE Token = %s AND FechaLogOut IS NULL;", (token,))
+            closed = cursor.rowcount > 0
+        self.token_cache.invalidate(token)
+        return closed
+
     # Usuarios
     def get_users(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT (U.id, U.Nombre, R.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Roles AS R ON U.idRol = R.id INNER JOIN Paises AS P ON U.idPais = P.id;")
-        users = cursor.fetchall()
-        cursor.close()
+        with self.pool.cursor() as cursor:
+            cursor.execute("SELECT (U.id, U.Nombre, R.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Roles AS R ON U.idRol = R.id INNER JOIN Paises AS P ON U.idPais = P.id;")
+            users = cursor.fetchall()
         return users
     
     # Encuestas
@@ -142,15 +361,23 @@ class Database:
                 data['FechaCreacion'] = datetime.fromisoformat(data['FechaCreacion'])
                 data['FechaActualizacion'] = datetime.fromisoformat(data['FechaActualizacion'])
                 insert_result = self.encuestas.insert_one(data)
+                self._invalidate_validator(data.get('NumeroEncuesta'))
                 return insert_result
             else:
                 raise Exception("You don't have permission to create this survey.")
         except Exception as e:
             raise Exception(f"An error occurred during survey insertion: {str(e)}")
 
-    def get_public_surveys(self, page=1, limit=10):
-        offset = (page - 1) * limit
-        surveys = self.encuestas.find({"Disponible": 1}).skip(offset).limit(limit)
+    def get_public_surveys(self, page=1, limit=10, after=None):
+        # Con `after` se pagina por llave sobre el índice (Disponible, NumeroEncuesta),
+        # sin recorrer las páginas anteriores; `page` se mantiene por compatibilidad.
+        query = {"Disponible": 1}
+        if after is not None:
+            query["NumeroEncuesta"] = {"$gt": after}
+            surveys = self.encuestas.find(query).sort("NumeroEncuesta", 1).limit(limit)
+        else:
+            offset = (page - 1) * limit
+            surveys = self.encuestas.find(query).sort("NumeroEncuesta", 1).skip(offset).limit(limit)
         result = []
         for survey in surveys:
             survey['_id'] = str(survey['_id'])
@@ -172,7 +399,11 @@ class Database:
         if self.verify_token_creator_survey(idAutor, id, token):
             data['FechaCreacion'] = datetime.fromisoformat(data['FechaCreacion'])
             data['FechaActualizacion'] = datetime.fromisoformat(data['FechaActualizacion'])
+            if 'Preguntas' in data:
+                # Antes de reemplazar las preguntas, para que insert_question no reserve un Numero recibido
+                self.sync_question_counter(id, highest_question_number(data['Preguntas']))
             self.encuestas.update_one({"NumeroEncuesta": id}, {"$set": data})
+            self._invalidate_validator(id)
             return data
         return None
     
@@ -181,6 +412,8 @@ class Database:
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token):
             self.encuestas.delete_one({"NumeroEncuesta": id})
+            self.contadores.delete_one({"_id": f"preguntas:{id}"})
+            self._invalidate_validator(id)
             return True
         return False
 
@@ -210,30 +443,60 @@ class Database:
         token = data.pop('Token', None)
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token):
-            survey_questions = self.encuestas.find_one({"NumeroEncuesta": id}, {"Preguntas": 1})
-            max_number = self.encuestas.aggregate([
+            questions = data['Preguntas']
+            if isinstance(questions, dict):
+                questions = data['Preguntas'] = [questions]
+            if not questions:
+                return False
+            first_number = self.reserve_question_numbers(id, len(questions))
+            numbers = list(range(first_number, first_number + len(questions)))
+            for question, number in zip(questions, numbers):
+                question['Numero'] = number
+            result = self.encuestas.update_one(
+                {"NumeroEncuesta": id},
+                {"$push": {"Preguntas": {"$each": questions}}}
+            )
+            self._invalidate_validator(id)
+            return numbers if result.matched_count else False
+        return False
+
+    def reserve_question_numbers(self, id, count):
+        """
+        Reserva `count` números consecutivos en el contador de preguntas de
+        la encuesta y devuelve el primero. El contador se crea la primera
+        vez a partir del mayor Numero que ya exista en la encuesta.
+        """
+        key = f"preguntas:{id}"
+        for _ in range(2):
+            counter = self.contadores.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"Secuencia": count}},
+                return_document=ReturnDocument.AFTER
+            )
+            if counter:
+                return counter["Secuencia"] - count + 1
+            max_number = list(self.encuestas.aggregate([
                 {'$match': {'NumeroEncuesta': id}},
                 {'$unwind': '$Preguntas'},
                 {'$group': {
                     '_id': '$_id',
                     'maxNumero': {'$max': '$Preguntas.Numero'}
-                }},
-                {'$project': { 
-                    '_id': 0,  
-                    'maxNumero': 1 
                 }}
-            ])
-            max_number = list(max_number)[0]['maxNumero'] if max_number else 0
-            for question in data['Preguntas']:
-                max_number += 1
-                question['Numero'] = max_number
-                survey_questions['Preguntas'].append(question)
-            self.encuestas.update_one(
-                                                {"NumeroEncuesta": id},
-                                                {"$set": {"Preguntas": survey_questions['Preguntas']}}
-                                            )
-            return True
-        return False
+            ]))
+            max_number = (max_number[0]['maxNumero'] or 0) if max_number else 0
+            try:
+                # $max deja el valor correcto aunque otro proceso lo inicialice a la vez
+                self.contadores.update_one({"_id": key}, {"$max": {"Secuencia": max_number}}, upsert=True)
+            except DuplicateKeyError:
+                pass
+        raise Exception(f"Could not reserve question numbers for survey {id}")
+
+    def sync_question_counter(self, id, max_number):
+        """Sube el contador de preguntas de la encuesta hasta `max_number` si está por debajo."""
+        try:
+            self.contadores.update_one({"_id": f"preguntas:{id}"}, {"$max": {"Secuencia": max_number}}, upsert=True)
+        except DuplicateKeyError:
+            self.contadores.update_one({"_id": f"preguntas:{id}"}, {"$max": {"Secuencia": max_number}})
 
     def get_questions(self, id):
         survey_questions = self.encuestas.find_one({"NumeroEncuesta": id}, {"_id": 0, "Preguntas": 1})
@@ -243,62 +506,145 @@ class Database:
         token = data.pop('Token', None)
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token) and len(data["Preguntas"]) == 1:
-            survey = self.encuestas.find_one({"NumeroEncuesta": id}, {"_id": 0, "Preguntas": 1})
-            for question in survey['Preguntas']:
-                if question['Numero'] == questionId:
-                    question.update(data['Preguntas'][0])
-                    self.encuestas.update_one(
-                        {"NumeroEncuesta": id, "Preguntas.Numero": questionId},
-                        {"$set": {"Preguntas.$": data['Preguntas'][0]}}
-                    )
-                    return data['Preguntas'][0]
+            question = data['Preguntas'][0]
+            question['Numero'] = questionId
+            result = self.encuestas.update_one(
+                {"NumeroEncuesta": id, "Preguntas.Numero": questionId},
+                {"$set": {"Preguntas.$": question}}
+            )
+            self._invalidate_validator(id)
+            return question if result.matched_count else None
         return None
     
     def delete_question(self, id, questionId, data):
         token = data.pop('Token', None)
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token):
-            survey = self.encuestas.find_one({"NumeroEncuesta": id}, {"_id": 0, "Preguntas": 1})
-            for question in survey['Preguntas']:
-                if question['Numero'] == questionId:
-                    survey['Preguntas'].remove(question)
-                    self.encuestas.update_one(
-                        {"NumeroEncuesta": id},
-                        {"$set": {"Preguntas": survey['Preguntas']}}
-                    )
-                    return survey['Preguntas']
+            # Devuelve solo la pregunta eliminada (proyección posicional del documento previo)
+            survey = self.encuestas.find_one_and_update(
+                {"NumeroEncuesta": id, "Preguntas.Numero": questionId},
+                {"$pull": {"Preguntas": {"Numero": questionId}}},
+                projection={"_id": 0, "Preguntas.$": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            self._invalidate_validator(id)
+            return survey['Preguntas'][0] if survey else None
         return None
+    # Validación de respuestas
+    def survey_validator(self, num_encuesta):
+        validator = self.validators.cached(num_encuesta)
+        if validator is None:
+            survey = self.encuestas.find_one({"NumeroEncuesta": num_encuesta}, {"_id": 0, "NumeroEncuesta": 1, "Preguntas": 1})
+            if not survey:
+                # No se guarda: otro proceso puede crear la encuesta en cualquier momento
+                return missing_survey(num_encuesta)
+            validator = self.validators.put(num_encuesta, compile_survey(survey, answer_schema))
+        return validator
+
+    def _invalidate_validator(self, num_encuesta):
+        # En este proceso y, por el canal de invalidaciones, en los demás
+        self.validators.invalidate(num_encuesta)
+        if self.redis is not None and num_encuesta is not None:
+            self.redis.publish(INVALIDATION_CHANNEL, ValidatorCache.key(num_encuesta))
+
+    def apply_invalidations(self, keys):
+        """Invalidaciones publicadas por otros procesos (ver Cache.subscribe)."""
+        self.validators.apply_invalidations(keys)
+        self.token_cache.apply_invalidations(keys)
+
+    def validate_response(self, data):
+        # Convierte FechaRealizado y devuelve los errores de la respuesta
+        try:
+            data['FechaRealizado'] = datetime.fromisoformat(data['FechaRealizado'])
+        except (KeyError, TypeError, ValueError):
+            pass  # lo reporta el validador
+        num_encuesta = data.get('NumeroEncuesta')
+        if not isinstance(num_encuesta, int) or isinstance(num_encuesta, bool):
+            return answer_validator(data)
+        return self.survey_validator(num_encuesta)(data)
+
     def post_response(self, id, data):
         token = data.pop('Token', None)
+        errors = self.validate_response(data)
+        if errors:
+            raise ValueError("; ".join(errors))
         if self.verify_token_active(token):
-            data['FechaRealizado'] = datetime.fromisoformat(data['FechaRealizado'])
             self.respuestas.insert_one(data)
+            self.record_statistics([data])
             return data
         return None
-    def get_responses(self, id):
-        responses = self.respuestas.find({"NumeroEncuesta": id})
-        result = []
-        for response in responses:
+    def enqueue_response(self, id, data, idempotency_key=None):
+        # Valida y encola la respuesta; la inserta después un IngestWorker
+        token = data.pop('Token', None)
+        errors = self.validate_response(dict(data))
+        if errors:
+            raise ValueError("; ".join(errors))
+        if not self.verify_token_active(token):
+            return None
+        return ingestion.enqueue(self.redis, data, idempotency_key)
+
+    def insert_responses(self, answers):
+        """
+        Inserta un lote de respuestas con insert_many desordenado y actualiza
+        la estadística de las que se insertaron. Devuelve {índice: error}
+        de las filas rechazadas por MongoDB.
+        """
+        errors = {}
+        try:
+            self.respuestas.insert_many(answers, ordered=False)
+        except BulkWriteError as e:
+            errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+        self.record_statistics([answer for index, answer in enumerate(answers) if index not in errors])
+        return errors
+
+    def post_responses_bulk(self, id, token, rows):
+        """
+        Inserta un lote de respuestas de la encuesta `id` verificando el
+        token una sola vez. `rows` trae los documentos ya parseados (o la
+        excepción si la fila no se pudo leer). Devuelve None si el token no
+        es válido o el resumen con los errores por fila.
+        """
+        if not self.verify_token_active(token):
+            return None
+        answers, row_numbers, errors = prepare_bulk_rows(id, rows, self.survey_validator(id))
+        write_errors = self.insert_responses(answers) if answers else {}
+        return bulk_summary(answers, row_numbers, errors, write_errors)
+
+    def iter_responses(self, id, after=None, limit=None, fields=None, desde=None, hasta=None, batch_size=RESPONSES_BATCH_SIZE):
+        """
+        Recorre las respuestas de la encuesta en orden de _id sin cargarlas
+        todas en memoria: el cursor de Mongo trae lotes de `batch_size`.
+        `after` es el _id de la última respuesta recibida (paginación por
+        llave), `fields` limita los campos devueltos y `desde`/`hasta`
+        filtran por FechaRealizado. Los parámetros se validan al llamarla
+        (ValueError); el recorrido empieza al iterar.
+        """
+        projection = responses_projection(fields, limit, batch_size)
+        cursor = self.respuestas.find(responses_query(id, after, desde, hasta), projection).sort("_id", 1).batch_size(batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+        return self._iter_cursor(cursor)
+
+    @staticmethod
+    def _iter_cursor(cursor):
+        for response in cursor:
             response['_id'] = str(response['_id'])
-            result.append(response)
-        return result
+            yield response
     # sin probar
     def post_encuestado(self, data):
-        cursor = self.conn.cursor()
         data['FechaNacimiento'] = datetime.fromisoformat(data['FechaNacimiento'])
-        cursor.execute("INSERT INTO Usuarios (Nombre, idRol, Correo, Contrasenna, FechaCreacion, FechaNacimiento, Genero, idPais) VALUES (%s, %s, %s, %s, %s, NOW(), %s, %s) RETURNING id;", (data['Nombre'], 3, data['Correo'], data['Contrasenna'], data['FechaNacimiento'], data['Genero'], data['idPais']))
-        user = cursor.fetchone()
-        cursor.close()
+        with self.pool.cursor() as cursor:
+            cursor.execute("INSERT INTO Usuarios (Nombre, idRol, Correo, Contrasenna, FechaCreacion, FechaNacimiento, Genero, idPais) VALUES (%s, %s, %s, %s, %s, NOW(), %s, %s) RETURNING id;", (data['Nombre'], 3, data['Correo'], data['Contrasenna'], data['FechaNacimiento'], data['Genero'], data['idPais']))
+            user = cursor.fetchone()
         return True if user else False
 
     def get_encuestados(self,data): # requiere token
         token = data.pop('Token', None)
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token):
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT (U.id, U.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Paises AS P ON U.idPais = P.id WHERE U.idRol = 3;")
-            respondents = cursor.fetchall()
-            cursor.close()
+            with self.pool.cursor() as cursor:
+                cursor.execute("SELECT (U.id, U.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Paises AS P ON U.idPais = P.id WHERE U.idRol = 3;")
+                respondents = cursor.fetchall()
             return respondents
         return None
     
@@ -306,10 +652,9 @@ class Database:
         token = data.pop('Token', None)
         idAutor = data.get('IdAutor')
         if self.verify_token_creator_survey(idAutor, id, token):
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT (U.id, U.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Paises AS P ON U.idPais = P.id WHERE U.idRol = 3 AND U.id = %s;", (id,))
-            respondent = cursor.fetchone()
-            cursor.close()
+            with self.pool.cursor() as cursor:
+                cursor.execute("SELECT (U.id, U.Nombre, U.Correo, U.FechaCreacion, U.FechaNacimiento, OBTENER_GENERO(U.Genero), P.Nombre) FROM Usuarios AS U INNER JOIN Paises AS P ON U.idPais = P.id WHERE U.idRol = 3 AND U.id = %s;", (id,))
+                respondent = cursor.fetchone()
             return respondent
         return None
     def get_encuestado_by_token(self, token):
@@ -322,21 +667,21 @@ class Database:
     def actualizar_encuestado(self, id, data):
         token = data.pop('Token',data )
         idAutor = data.get('IdAutor')
-        if self.verify_token_creator_survey(idAutor, data, token):
+        # Sin encuesta: solo los administradores pueden actualizar encuestados
+        if self.verify_token_creator_survey(idAutor, None, token):
                 print("Updating database with:", data['Nombre'], data['Correo'], data['Contrasenna'], data['FechaNacimiento'], data['Genero'], data['idPais'], id)
 
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    UPDATE Usuarios SET 
-                    Nombre = %s, 
-                    Correo = %s, 
-                    Contrasenna = %s, 
-                    FechaNacimiento = %s, 
-                    Genero = %s, 
-                    idPais = %s 
-                    WHERE id = %s;
-                """, (data['Nombre'], data['Correo'], data['Contrasenna'], data['FechaNacimiento'], data['Genero'], data['idPais'], id))
-                cursor.close()
+                with self.pool.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE Usuarios SET 
+                        Nombre = %s, 
+                        Correo = %s, 
+                        Contrasenna = %s, 
+                        FechaNacimiento = %s, 
+                        Genero = %s, 
+                        idPais = %s 
+                        WHERE id = %s;
+                    """, (data['Nombre'], data['Correo'], data['Contrasenna'], data['FechaNacimiento'], data['Genero'], data['idPais'], id))
                 return True
     
         return False
@@ -347,27 +692,73 @@ class Database:
 
         # Proceed if the token is valid
         try:
-            with self.conn.cursor() as cursor:
+            # The pool commits the transaction when the block exits
+            with self.pool.cursor() as cursor:
                 # Execute SQL command to delete the user based on id
                 cursor.execute("DELETE FROM Usuarios WHERE id = %s;", (id,))
-                self.conn.commit()  # Commit the transaction to finalize the deletion
+                deleted = cursor.rowcount > 0
+
+            # Drop any cached session of the deleted user
+            self.token_cache.invalidate_user(id)
 
-                # Check if the deletion was successful
-                if cursor.rowcount > 0:
-                    return True  # Return True if the deletion affected at least one row
-                else:
-                    return False  # Return False if no rows were affected (user not found)
+            # Return True if the deletion affected at least one row, False if the user was not found
+            return deleted
 
         except Exception as e:
-            # If an exception occurred, rollback any changes and print the error
-            self.conn.rollback()
+            # If an exception occurred, the pool already rolled back; print the error
             print(f"Error deleting respondent: {e}")
             return False
 
-    def get_analytics(self, id):
-        survey = self.encuestas.find_one({"NumeroEncuesta": id})
-        if survey:
-            survey['_id'] = str(survey['_id'])
+    # Estadísticas
+    def record_statistics(self, answers):
+        # Suma las respuestas a la estadística materializada de cada encuesta
+        updates = []
+        for num_encuesta, update in analytics.increments(answers).items():
+            update = {operator: fields for operator, fields in update.items() if fields}
+            updates.append(UpdateOne({"_id": num_encuesta}, update, upsert=True))
+        if updates:
+            self.estadisticas.bulk_write(updates, ordered=False)
+        # Candidatos a términos frecuentes: se leen solo los contadores tocados
+        for num_encuesta, questions in analytics.touched_terms(answers).items():
+            document = self.estadisticas.find_one({"_id": num_encuesta}, analytics.terms_projection(questions))
+            update = analytics.heavy_hitter_updates(document or {}, questions)
+            if update:
+                self.estadisticas.update_one({"_id": num_encuesta}, update)
+
+    def rebuild_statistics(self, id=None):
+        """
+        Recalcula la estadística materializada desde `respuestas` (de una
+        encuesta o de todas) aplicando en memoria las mismas actualizaciones
+        que `record_statistics`. Las respuestas que lleguen mientras se
+        recalcula una encuesta pueden quedar fuera; conviene ejecutarlo con
+        las escrituras detenidas o volver a ejecutarlo después.
+        """
+        ids = [id] if id is not None else self.respuestas.distinct("NumeroEncuesta")
+        projection = {"_id": 0, "NumeroEncuesta": 1, "IdEncuestado": 1, "FechaRealizado": 1,
+                      "Preguntas.Numero": 1, "Preguntas.Categoria": 1, "Preguntas.Respuesta": 1}
+        for num_encuesta in ids:
+            document = {"_id": num_encuesta}
+            answers = self.respuestas.find({"NumeroEncuesta": num_encuesta}, projection).batch_size(RESPONSES_BATCH_SIZE)
+            for answer in answers:
+                analytics.apply_update(document, analytics.increments([answer])[num_encuesta])
+                for questions in analytics.touched_terms([answer]).values():
+                    update = analytics.heavy_hitter_updates(document, questions)
+                    if update:
+                        analytics.apply_update(document, update)
+            self.estadisticas.replace_one({"_id": num_encuesta}, document, upsert=True)
+        return len(ids)
+
+    def get_analytics(self, id, approx=False):
+        survey = self.encuestas.find_one(
+            {"NumeroEncuesta": id},
+            {"_id": 0, "NumeroEncuesta": 1, "Titulo": 1, "Preguntas.Numero": 1, "Preguntas.Categoria": 1, "Preguntas.Pregunta": 1, "Preguntas.Opciones": 1}
+        )
+        if not survey:
+            return None
+        statistics = self.estadisticas.find_one({"_id": id})
+        if statistics:
+            counts = analytics.from_materialized(statistics)
         else:
-            survey = None
-        return survey
\ No newline at end of file
+            # Sin estadística materializada (p. ej. antes de rebuild-stats)
+            counts = analytics.from_pipeline(next(self.respuestas.aggregate(analytics.pipeline(id))))
+        return analytics.summarize(counts, survey, approx)
@@ -1,4 +1,5 @@
 from faker import Faker
+import copy
 import random
 
 jsonEncuestadosInfo = [
@@ -62,42 +63,71 @@ jsonFormatoPregRespuestas = {
                         }
 }
 
-def generate_answers(surveys):
-    fake = Faker()
-    rnd = random.Random()
-    answers = []
-    for i in range(len(surveys)):
-        survey = surveys[i]
+class RespondentPool:
+    """
+    Encuestados para las respuestas: los de jsonEncuestadosInfo y, hasta
+    completar `size`, otros sintéticos con id a partir del siguiente. Se
+    construyen al pedirlos, así que un grupo grande no ocupa memoria.
+    """
+
+    def __init__(self, size):
+        self.size = max(size, len(jsonEncuestadosInfo))
+        self.first_id = max(encuestado["id"] for encuestado in jsonEncuestadosInfo) + 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        if index < len(jsonEncuestadosInfo):
+            return jsonEncuestadosInfo[index]
+        id = self.first_id + index - len(jsonEncuestadosInfo)
+        return {"Nombre": f"Encuestado {id}", "id": id, "Correo": f"encuestado{id}@dominio.com"}
+
+def answer_value(question, rnd, fake):
+    if question["Categoria"] == "Abiertas":
+        return fake.text()
+    elif question["Categoria"] == "EleccionSimples":
+        return rnd.choice(question["Opciones"])
+    elif question["Categoria"] == "EleccionMultiples":
+        cant_opciones = rnd.randint(1, len(question["Opciones"]))
+        return rnd.sample(question["Opciones"], cant_opciones)
+    elif question["Categoria"] == "EscalaCalificacion":
+        return rnd.randint(question["Opciones"][0], question["Opciones"][1])
+    elif question["Categoria"] == "SiNo":
+        return rnd.randint(0, 1)
+    elif question["Categoria"] == "Numericas":
+        return rnd.randint(1, 100)
+
+def generate_answer(survey, encuestado, rnd, fake):
+    # Copias profundas: cada respuesta tiene su propia lista de Preguntas
+    answer = copy.deepcopy(jsonFormatoRespuestas)
+    answer["NumeroEncuesta"] = survey["NumeroEncuesta"]
+    answer["IdEncuestado"] = encuestado["id"]
+    answer["Nombre"] = encuestado["Nombre"]
+    answer["Correo"] = encuestado["Correo"]
+    answer["FechaRealizado"] = fake.date_time().isoformat()
+    for question in survey["Preguntas"]:
+        preg_resp = copy.deepcopy(jsonFormatoPregRespuestas[question["Categoria"]])
+        preg_resp["Numero"] = question["Numero"]
+        preg_resp["Pregunta"] = question["Pregunta"]
+        preg_resp["Respuesta"] = answer_value(question, rnd, fake)
+        answer["Preguntas"].append(preg_resp)
+    return answer
+
+def iter_answers(surveys, cant_respuestas=3, encuestados=None, rnd=None, fake=None):
+    rnd = rnd or random.Random()
+    fake = fake or Faker()
+    encuestados = encuestados or jsonEncuestadosInfo
+    for survey in surveys:
         if survey["Disponible"] == 1:
-            cant_respuestas = 3
-            answer = jsonFormatoRespuestas.copy()
-            answer["NumeroEncuesta"] = survey["NumeroEncuesta"]
             for z in range(cant_respuestas):
-                encuestado = rnd.choice(jsonEncuestadosInfo)
-                answer["IdEncuestado"] = encuestado["id"]
-                answer["Nombre"] = encuestado["Nombre"]
-                answer["Correo"] = encuestado["Correo"]
-                answer["FechaRealizado"] = fake.date_time().isoformat()
-                questions = survey["Preguntas"]
-                for j in range(len(questions)):
-                    question = questions[j]
-                    preg_resp = jsonFormatoPregRespuestas[question["Categoria"]].copy()
-                    preg_resp["Numero"] = question["Numero"]
-                    preg_resp["Categoria"] = question["Categoria"]
-                    preg_resp["Pregunta"] = question["Pregunta"]
-                    if question["Categoria"] == "Abiertas":
-                        preg_resp["Respuesta"] = fake.text()
-                    elif question["Categoria"] == "EleccionSimples":
-                        preg_resp["Respuesta"] = rnd.choice(question["Opciones"])
-                    elif question["Categoria"] == "EleccionMultiples":
-                        cant_opciones = rnd.randint(1, len(question["Opciones"]))
-                        preg_resp["Respuesta"] = rnd.sample(question["Opciones"], cant_opciones)
-                    elif question["Categoria"] == "EscalaCalificacion":
-                        preg_resp["Respuesta"] = rnd.randint(question["Opciones"][0], question["Opciones"][1])
-                    elif question["Categoria"] == "SiNo":
-                        preg_resp["Respuesta"] = rnd.randint(0, 1)
-                    elif question["Categoria"] == "Numericas":
-                        preg_resp["Respuesta"] = rnd.randint(1, 100)
-                    answer["Preguntas"].append(preg_resp)
-                answers.append(answer)     
-    return answers
+                yield generate_answer(survey, rnd.choice(encuestados), rnd, fake)
+
+def generate_answers(surveys, cant_respuestas=3, seed=None):
+    fake = Faker()
+    rnd = random.Random(seed)
+    if seed is not None:
+        fake.seed_instance(seed)
+    return list(iter_answers(surveys, cant_respuestas, rnd=rnd, fake=fake))
@@ -0,0 +1,144 @@
+"""
+Generación de datos sintéticos a gran escala (`python manage.py generate`).
+
+Cada encuesta usa su propia semilla derivada de la semilla general y de su
+número, así que el resultado es el mismo con cualquier cantidad de procesos.
+Los procesos generan bloques de encuestas con sus respuestas y los escriben
+en archivos parciales (que se concatenan en orden) o directo en MongoDB.
+"""
+import hashlib
+import json
+import os
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+from faker import Faker
+
+import generate_answers as ga
+import generate_questions as gq
+import seed
+from config import SEED_BATCH_SIZE
+
+_fake = None
+
+
+def _faker():
+    # Crear Faker es costoso: uno por proceso, resembrado por encuesta
+    global _fake
+    if _fake is None:
+        _fake = Faker()
+    return _fake
+
+
+def survey_random(seed_value, numero):
+    rnd = random.Random(f"{seed_value}:{numero}")
+    fake = _faker()
+    fake.seed_instance(rnd.getrandbits(64))
+    return rnd, fake
+
+
+def generate_block(seed_value, first, last, questions, answers, respondents):
+    """Genera las encuestas first..last-1 y devuelve (encuesta, [respuestas]) por cada una."""
+    for numero in range(first, last):
+        rnd, fake = survey_random(seed_value, numero)
+        survey = gq.generate_survey(numero, questions, rnd, fake)
+        yield survey, list(ga.iter_answers([survey], answers, respondents, rnd, fake))
+
+
+def document_id(seed_value, *parts):
+    # _id determinista: repetir la generación no duplica documentos
+    key = ":".join(str(part) for part in (seed_value,) + parts).encode()
+    return ObjectId(hashlib.md5(key).digest()[:12])
+
+
+def _write_block(task):
+    seed_value, first, last, questions, answers, respondents, surveys_path, answers_path = task
+    total = 0
+    with open(surveys_path, "w") as surveys_file, open(answers_path, "w") as answers_file:
+        for survey, survey_answers in generate_block(seed_value, first, last, questions, answers, respondents):
+            surveys_file.write(json.dumps(survey) + "\n")
+            for answer in survey_answers:
+                answers_file.write(json.dumps(answer) + "\n")
+            total += len(survey_answers)
+    return last - first, total
+
+
+def _insert_block(task):
+    seed_value, first, last, questions, answers, respondents, uri, database, batch_size = task
+    from pymongo import MongoClient
+
+    client = MongoClient(uri)
+    encuestas, respuestas = client[database]["encuestas"], client[database]["respuestas"]
+    surveys, batch, total = [], [], 0
+    try:
+        for survey, survey_answers in generate_block(seed_value, first, last, questions, answers, respondents):
+            survey["_id"] = document_id(seed_value, "encuesta", survey["NumeroEncuesta"])
+            for field in seed.SURVEY_DATE_FIELDS:
+                survey[field] = datetime.fromisoformat(survey[field])
+            surveys.append(survey)
+            for index, answer in enumerate(survey_answers):
+                answer["_id"] = document_id(seed_value, "respuesta", survey["NumeroEncuesta"], index)
+                for field in seed.ANSWER_DATE_FIELDS:
+                    answer[field] = datetime.fromisoformat(answer[field])
+                batch.append(answer)
+                if len(batch) >= batch_size:
+                    total += seed.insert_batch(respuestas, batch)
+                    batch = []
+        if batch:
+            total += seed.insert_batch(respuestas, batch)
+        if surveys:
+            seed.insert_batch(encuestas, surveys)
+    finally:
+        client.close()
+    return last - first, total
+
+
+def blocks(surveys, block_size):
+    for first in range(1, surveys + 1, block_size):
+        yield first, min(first + block_size, surveys + 1)
+
+
+def to_jsonl(output_dir, surveys, questions=None, answers=3, respondents=None, seed_value=0, workers=None,
+             block_size=100, report=print):
+    """
+    Escribe data_surveys.jsonl y data_answers.jsonl en `output_dir`.
+    Devuelve (encuestas, respuestas) generadas.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pool = ga.RespondentPool(respondents) if respondents else ga.jsonEncuestadosInfo
+    surveys_path = os.path.join(output_dir, "data_surveys.jsonl")
+    answers_path = os.path.join(output_dir, "data_answers.jsonl")
+    tasks = []
+    for index, (first, last) in enumerate(blocks(surveys, block_size)):
+        tasks.append((seed_value, first, last, questions, answers, pool,
+                      f"{surveys_path}.{index}.part", f"{answers_path}.{index}.part"))
+    generated = [0, 0]
+    with ProcessPoolExecutor(workers) as executor, open(surveys_path, "wb") as surveys_file, open(answers_path, "wb") as answers_file:
+        # map conserva el orden: los parciales se agregan a medida que terminan los anteriores
+        for task, (block_surveys, block_answers) in zip(tasks, executor.map(_write_block, tasks)):
+            for part, output in ((task[6], surveys_file), (task[7], answers_file)):
+                with open(part, "rb") as file:
+                    shutil.copyfileobj(file, output)
+                os.remove(part)
+            generated[0] += block_surveys
+            generated[1] += block_answers
+            report(f"{generated[0]}/{surveys} encuestas, {generated[1]} respuestas")
+    return tuple(generated)
+
+
+def to_mongo(uri, database, surveys, questions=None, answers=3, respondents=None, seed_value=0, workers=None,
+             block_size=100, batch_size=SEED_BATCH_SIZE, report=print):
+    """Inserta las encuestas y respuestas directo en MongoDB, en lotes y en paralelo."""
+    pool = ga.RespondentPool(respondents) if respondents else ga.jsonEncuestadosInfo
+    tasks = [(seed_value, first, last, questions, answers, pool, uri, database, batch_size)
+             for first, last in blocks(surveys, block_size)]
+    generated = [0, 0]
+    with ProcessPoolExecutor(workers) as executor:
+        for block_surveys, block_answers in executor.map(_insert_block, tasks):
+            generated[0] += block_surveys
+            generated[1] += block_answers
+            report(f"{generated[0]}/{surveys} encuestas, {generated[1]} respuestas insertadas")
+    return tuple(generated)
@@ -1,4 +1,5 @@
 from faker import Faker
+import copy
 import random
 
 jsonAutoresInfo = [
@@ -58,53 +59,53 @@ jsonFormatosPreguntas = [{
                         }
 ]
 
-def generate_options_number():
-    fake = Faker()
-    rnd = random.Random()
+def generate_options_number(rnd=None):
+    rnd = rnd or random.Random()
     min = rnd.randint(1, 5)
     max = rnd.randint(6, 10)
-    opciones = [min, max]
     return [min, max]
 
-def generate_options_word():
-    fake = Faker()
-    rnd = random.Random()
+def generate_options_word(rnd=None, fake=None):
+    rnd = rnd or random.Random()
+    fake = fake or Faker()
     cant_opciones = rnd.randint(4, 6)
-    opciones = []
-    for i in range(1, cant_opciones+1):
-        opcion = fake.word()
-        opciones.append(opcion)
-    return opciones
+    # Sin repetidas: EleccionMultiples no admite opciones repetidas
+    return fake.words(cant_opciones, unique=True)
 
-def generate_questions():
-    fake = Faker()
-    rnd = random.Random()
-    cant_preguntas = rnd.randint(5, 10)
-    preguntas = []
-    for i in range(1, cant_preguntas+1):
-        tipo_pregunta = rnd.randint(0, 5)
-        pregunta = jsonFormatosPreguntas[tipo_pregunta].copy()
-        if tipo_pregunta in [1, 2, 3]:
-            pregunta["Opciones"] = generate_options_number() if tipo_pregunta == 3 else generate_options_word()
-        pregunta["Numero"] = i
-        pregunta["Pregunta"] = fake.sentence()
-        preguntas.append(pregunta)
-    return preguntas
+def generate_question(numero, rnd, fake):
+    tipo_pregunta = rnd.randint(0, 5)
+    # Copia profunda para no compartir listas con la plantilla
+    pregunta = copy.deepcopy(jsonFormatosPreguntas[tipo_pregunta])
+    if tipo_pregunta in [1, 2, 3]:
+        pregunta["Opciones"] = generate_options_number(rnd) if tipo_pregunta == 3 else generate_options_word(rnd, fake)
+    pregunta["Numero"] = numero
+    pregunta["Pregunta"] = fake.sentence()
+    return pregunta
+
+def generate_questions(cant_preguntas=None, rnd=None, fake=None):
+    rnd = rnd or random.Random()
+    fake = fake or Faker()
+    if cant_preguntas is None:
+        cant_preguntas = rnd.randint(5, 10)
+    return [generate_question(i, rnd, fake) for i in range(1, cant_preguntas+1)]
+
+def generate_survey(numero, cant_preguntas=None, rnd=None, fake=None):
+    rnd = rnd or random.Random()
+    fake = fake or Faker()
+    encuesta = copy.deepcopy(jsonFormatoEncuestas)
+    encuesta["NumeroEncuesta"] = numero
+    encuesta["Titulo"] = fake.sentence()
+    encuesta["IdAutor"] = rnd.choice(jsonAutoresInfo)["id"]
+    encuesta["Autor"] = jsonAutoresInfo[encuesta["IdAutor"] - 1]["Nombre"]
+    encuesta["FechaCreacion"] = fake.date()
+    encuesta["FechaActualizacion"] = fake.date()
+    encuesta["Disponible"] = 1
+    encuesta["Preguntas"] = generate_questions(cant_preguntas, rnd, fake)
+    return encuesta
 
-def generate_surveys():
+def generate_surveys(cant_encuestas=10, cant_preguntas=None, seed=None):
     fake = Faker()
-    rnd = random.Random()
-    cant_encuestas = 10
-    encuestas = []
-    for i in range(1, cant_encuestas+1):
-        encuesta = jsonFormatoEncuestas.copy()
-        encuesta["NumeroEncuesta"] = i
-        encuesta["Titulo"] = fake.sentence()
-        encuesta["IdAutor"] = rnd.choice(jsonAutoresInfo)["id"]
-        encuesta["Autor"] = jsonAutoresInfo[encuesta["IdAutor"] - 1]["Nombre"]
-        encuesta["FechaCreacion"] = fake.date()
-        encuesta["FechaActualizacion"] = fake.date()
-        encuesta["Disponible"] = 1
-        encuesta["Preguntas"] = generate_questions()
-        encuestas.append(encuesta)
-    return encuestas
\ No newline at end of file
+    rnd = random.Random(seed)
+    if seed is not None:
+        fake.seed_instance(seed)
+    return [generate_survey(i, cant_preguntas, rnd, fake) for i in range(1, cant_encuestas+1)]
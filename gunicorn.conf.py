@@ -0,0 +1,31 @@
+# Servidor de producción: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+
+# app.py se importa una vez en el proceso principal (preload) y cada worker
+# abre sus propias conexiones en post_fork
+os.environ["INICIO_DIFERIDO"] = "1"
+
+from config import WEB_BIND, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT, WEB_MAX_REQUESTS
+
+bind = WEB_BIND
+workers = WEB_WORKERS or multiprocessing.cpu_count() * 2 + 1
+threads = WEB_THREADS
+worker_class = "gthread"
+preload_app = True
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+# Reciclar workers de a poco evita que se reinicien todos a la vez
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS // 10
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    import app
+    app.init_backends()
+
+
+def worker_exit(server, worker):
+    import app
+    app.close_backends()
@@ -0,0 +1,130 @@
+import json
+import os
+import socket
+from datetime import datetime
+
+import redis
+from bson import ObjectId
+
+from config import INGEST_STREAM, INGEST_GROUP, INGEST_BATCH_SIZE, INGEST_BLOCK_MS, INGEST_CLAIM_IDLE_MS
+
+DEAD_LETTER_STREAM = f"{INGEST_STREAM}:errores"
+IDEMPOTENCY_TTL = 24 * 3600
+DUPLICATE_KEY = 11000
+
+
+def enqueue(redis_client, data, idempotency_key=None):
+    """
+    Encola la respuesta en el stream de ingesta y devuelve su recibo. El
+    recibo es también el _id con que se insertará, así que una entrega
+    repetida del mismo mensaje no duplica la respuesta. Con
+    `idempotency_key` un reintento del cliente devuelve el recibo original.
+    """
+    receipt = str(ObjectId())
+    if idempotency_key:
+        key = f"idempotencia:{idempotency_key}"
+        if not redis_client.set(key, receipt, nx=True, ex=IDEMPOTENCY_TTL):
+            return redis_client.get(key)
+    try:
+        redis_client.xadd(INGEST_STREAM, {"recibo": receipt, "respuesta": json.dumps(data)})
+    except Exception:
+        # Sin la llave el reintento del cliente vuelve a encolar en vez de recibir un recibo perdido
+        if idempotency_key:
+            redis_client.delete(key)
+        raise
+    return receipt
+
+
+async def enqueue_async(redis_client, data, idempotency_key=None):
+    """`enqueue` sobre redis.asyncio."""
+    receipt = str(ObjectId())
+    if idempotency_key:
+        key = f"idempotencia:{idempotency_key}"
+        if not await redis_client.set(key, receipt, nx=True, ex=IDEMPOTENCY_TTL):
+            return await redis_client.get(key)
+    try:
+        await redis_client.xadd(INGEST_STREAM, {"recibo": receipt, "respuesta": json.dumps(data)})
+    except Exception:
+        if idempotency_key:
+            await redis_client.delete(key)
+        raise
+    return receipt
+
+
+class IngestWorker:
+    """
+    Consumidor del grupo INGEST_GROUP: lee lotes del stream, los inserta
+    en `respuestas` con insert_many desordenado y confirma (XACK) solo
+    después de insertar. Los mensajes de consumidores caídos se reclaman
+    tras INGEST_CLAIM_IDLE_MS, por lo que la entrega es al menos una vez.
+    """
+
+    def __init__(self, database, redis_client, name=None, batch_size=INGEST_BATCH_SIZE, block_ms=INGEST_BLOCK_MS):
+        self.database = database
+        self.redis = redis_client
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.running = True
+
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(INGEST_STREAM, INGEST_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def run(self):
+        self.ensure_group()
+        while self.running:
+            self.run_once()
+
+    def run_once(self):
+        # Primero los mensajes abandonados por otros consumidores
+        _, messages, *_ = self.redis.xautoclaim(
+            INGEST_STREAM, INGEST_GROUP, self.name, INGEST_CLAIM_IDLE_MS, start_id="0-0", count=self.batch_size)
+        if not messages:
+            streams = self.redis.xreadgroup(
+                INGEST_GROUP, self.name, {INGEST_STREAM: ">"}, count=self.batch_size, block=self.block_ms)
+            messages = streams[0][1] if streams else []
+        if messages:
+            self.process(messages)
+        return len(messages)
+
+    def process(self, messages):
+        answers, message_ids, failed = [], [], []
+        fields_by_id = dict(messages)
+        for message_id, fields in messages:
+            if fields is None:
+                # Entrada borrada del stream mientras estaba pendiente
+                continue
+            try:
+                answer = json.loads(fields["respuesta"])
+                answer["_id"] = ObjectId(fields["recibo"])
+                answer["FechaRealizado"] = datetime.fromisoformat(answer["FechaRealizado"])
+                answers.append(answer)
+                message_ids.append(message_id)
+            except (KeyError, TypeError, ValueError) as e:
+                failed.append((message_id, fields, str(e)))
+
+        errors = self.database.insert_responses(answers) if answers else {}
+        for index, error in errors.items():
+            if error["code"] != DUPLICATE_KEY:
+                failed.append((message_ids[index], fields_by_id[message_ids[index]], error["errmsg"]))
+
+        # Los mensajes que no se pueden insertar pasan a la cola de errores
+        if failed:
+            pipe = self.redis.pipeline()
+            for message_id, fields, error in failed:
+                pipe.xadd(DEAD_LETTER_STREAM, dict(fields, error=error, mensaje=message_id))
+            pipe.execute()
+
+        acked = [message_id for message_id, _ in messages]
+        pipe = self.redis.pipeline()
+        pipe.xack(INGEST_STREAM, INGEST_GROUP, *acked)
+        pipe.xdel(INGEST_STREAM, *acked)
+        pipe.execute()
+
+    def stop(self, *args):
+        self.running = False
+
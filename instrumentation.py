@@ -0,0 +1,320 @@
+"""
+Instrumentación de la API: cuánto tiempo pasa cada petición en PostgreSQL,
+MongoDB, Redis y la serialización JSON.
+
+Los ganchos de cada backend (TimedCursor en pg_pool.py, MongoListener en
+db.py, instrument_redis) y los tramos de código (span, traced,
+instrument_methods) acumulan llamadas y segundos en la traza de la
+petición, guardada en `g`, y en el registro del proceso. Al responder se
+agrega el encabezado Server-Timing y /metrics expone el registro en el
+formato de texto de Prometheus. Con gunicorn cada worker tiene su propio
+registro.
+
+Con PROFILE_SLOW_MS > 0 un hilo muestrea las pilas de las peticiones en
+curso y las que tardan más que ese umbral se guardan en PROFILE_DIR como
+pilas colapsadas (flamegraph.pl, speedscope).
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+from config import PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Métricas de pool.metrics() y cache.metrics() que no son acumulativas
+GAUGES = {"min", "max", "in_use", "wait_avg", "wait_max", "local_size"}
+
+
+class Trace:
+    """Llamadas y segundos por backend o tramo, contadores y muestras de una petición."""
+
+    __slots__ = ("start", "timings", "counters", "samples")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.counters = Counter()
+        self.samples = Counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+class Registry:
+    """Acumulados del proceso desde que arrancó."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.counters = Counter()
+        self.requests = defaultdict(lambda: [[0] * len(BUCKETS), 0, 0.0])
+
+    def record(self, name, seconds, calls=1):
+        with self._lock:
+            timing = self.timings[name]
+            timing[0] += calls
+            timing[1] += seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, endpoint, method, status, seconds):
+        with self._lock:
+            histogram = self.requests[(endpoint, method, status)]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return (
+                {name: list(timing) for name, timing in self.timings.items()},
+                dict(self.counters),
+                {labels: (list(buckets), total, seconds) for labels, (buckets, total, seconds) in self.requests.items()},
+            )
+
+
+registry = Registry()
+
+
+def current():
+    """Traza de la petición en curso, o None fuera de una petición."""
+    return g.get("traza") if has_request_context() else None
+
+
+def record(name, seconds, calls=1):
+    registry.record(name, seconds, calls)
+    trace = current()
+    if trace is not None:
+        timing = trace.timings[name]
+        timing[0] += calls
+        timing[1] += seconds
+
+
+def count(name, value=1):
+    registry.count(name, value)
+    trace = current()
+    if trace is not None:
+        trace.counters[name] += value
+
+
+class span:
+    """Mide un bloque: `with span("cache.fetch"): ...`"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def traced(name, function):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    timed.__name__ = getattr(function, "__name__", name)
+    timed.__doc__ = function.__doc__
+    return timed
+
+
+def instrument_methods(obj, prefix, exclude=()):
+    """
+    Mide cada método público de `obj` como el tramo `<prefix>.<método>`.
+    Los que devuelven generadores van en `exclude`: solo se mediría su creación.
+    """
+    for name in dir(type(obj)):
+        if name.startswith("_") or name in exclude or not callable(getattr(type(obj), name)):
+            continue
+        setattr(obj, name, traced(f"{prefix}.{name}", getattr(obj, name)))
+    return obj
+
+
+def instrument_redis(client):
+    """Mide los comandos y pipelines del cliente (incluye los scripts Lua)."""
+    client.execute_command = traced("redis", client.execute_command)
+    pipeline = client.pipeline
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = traced("redis", pipe.execute)
+        return pipe
+
+    client.pipeline = timed_pipeline
+    return client
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # Serialización de jsonify; la de las respuestas en caché llega por Cache(on_serialize=...)
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record("json", time.perf_counter() - start)
+
+
+# Perfilador por muestreo
+class Sampler:
+    """
+    Cada `interval` segundos guarda la pila de cada hilo que atiende una
+    petición. Solo se inicia con PROFILE_SLOW_MS > 0.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, trace):
+        with self._lock:
+            self._active[threading.get_ident()] = trace
+            if self._thread is None:
+                # Se inicia en la primera petición: los hilos no sobreviven al fork de gunicorn
+                self._thread = threading.Thread(target=self._run, name="perfilador", daemon=True)
+                self._thread.start()
+
+    def remove(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, trace in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        trace.samples[collapse(frame)] += 1
+
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def write_profile(trace, seconds):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^\w.-]", "_", request.endpoint or "none")
+    path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{os.getpid()}-{name}-{int(seconds * 1000)}ms.folded")
+    with open(path, "w") as file:
+        for stack, samples in trace.samples.items():
+            file.write(f"{stack} {samples}\n")
+    return path
+
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS > 0 else None
+
+
+# Integración con Flask
+def server_timing(trace):
+    metrics = [f'{name};dur={seconds * 1000:.2f};desc="{calls} calls"'
+               for name, (calls, seconds) in trace.timings.items()]
+    if "cache_served" in trace.counters or "cache_loaded" in trace.counters:
+        hit = trace.counters["cache_served"] and not trace.counters["cache_loaded"]
+        metrics.append(f'cache;desc="{"hit" if hit else "miss"}"')
+    metrics.append(f"total;dur={trace.elapsed() * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+def init_app(app):
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_trace():
+        g.traza = Trace()
+        if sampler is not None:
+            sampler.add(g.traza)
+
+    @app.after_request
+    def add_server_timing(response):
+        trace = current()
+        if trace is not None:
+            g.estado = response.status_code
+            response.headers["Server-Timing"] = server_timing(trace)
+            if response.content_length is not None:
+                count("response_bytes", response.content_length)
+        return response
+
+    @app.teardown_request
+    def finish_trace(error=None):
+        # Con respuestas transmitidas se ejecuta al terminar de enviarlas
+        trace = g.pop("traza", None)
+        if trace is None:
+            return
+        if sampler is not None:
+            sampler.remove()
+        seconds = trace.elapsed()
+        status = "500" if error is not None else str(g.pop("estado", 200))
+        registry.observe(request.endpoint or "none", request.method, status, seconds)
+        if sampler is not None and seconds * 1000 >= PROFILE_SLOW_MS and trace.samples:
+            write_profile(trace, seconds)
+
+
+# Formato de texto de Prometheus
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def render(**sections):
+    """
+    Métricas del registro y, por cada `sección=dict` (pool.metrics(),
+    cache.metrics()), una serie app_<sección>_<nombre>.
+    """
+    timings, counters, requests = registry.snapshot()
+    lines = [
+        "# HELP app_requests_seconds Request duration.",
+        "# TYPE app_requests_seconds histogram",
+    ]
+    for (endpoint, method, status), (buckets, total, seconds) in sorted(requests.items()):
+        labels = dict(endpoint=endpoint, method=method, status=status)
+        for bound, observed in zip(BUCKETS, buckets):
+            lines.append(f"app_requests_seconds_bucket{_labels(**labels, le=bound)} {observed}")
+        lines.append(f'app_requests_seconds_bucket{_labels(**labels, le="+Inf")} {total}')
+        lines.append(f"app_requests_seconds_sum{_labels(**labels)} {seconds}")
+        lines.append(f"app_requests_seconds_count{_labels(**labels)} {total}")
+    lines += [
+        "# HELP app_calls_total Round trips per backend and calls per span.",
+        "# TYPE app_calls_total counter",
+    ]
+    lines += [f"app_calls_total{_labels(name=name)} {calls}" for name, (calls, _) in sorted(timings.items())]
+    lines += [
+        "# HELP app_seconds_total Time spent per backend and span.",
+        "# TYPE app_seconds_total counter",
+    ]
+    lines += [f"app_seconds_total{_labels(name=name)} {seconds}" for name, (_, seconds) in sorted(timings.items())]
+    for name, value in sorted(counters.items()):
+        lines += [f"# TYPE app_{name}_total counter", f"app_{name}_total {value}"]
+    for section, metrics in sections.items():
+        for name, value in sorted(metrics.items()):
+            if name in GAUGES:
+                metric, kind = f"app_{section}_{name}", "gauge"
+            else:
+                metric, kind = f"app_{section}_{name}" + ("" if name.endswith("_total") else "_total"), "counter"
+            lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
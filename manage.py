@@ -0,0 +1,190 @@
+import argparse
+import multiprocessing
+import signal
+import sys
+
+import redis
+from pymongo import MongoClient, UpdateOne
+
+import seed
+from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, mongo_uri, SEED_BATCH_SIZE
+from config import REDIS_HOST, REDIS_PORT, INGEST_BATCH_SIZE
+from db import Database, highest_question_number
+from ingestion import IngestWorker
+
+
+def mongo_database():
+    return MongoClient(mongo_uri)[DB_NAME]
+
+
+def redis_client():
+    return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+
+def database(redis_client=None):
+    return Database(database=DB_NAME, host=DB_HOST, user=DB_USER, password=DB_PASSWORD, port=DB_PORT, uri=mongo_uri,
+                    redis_client=redis_client)
+
+
+def sync_question_counters(database, reset=False, batch_size=SEED_BATCH_SIZE):
+    """
+    Lleva el contador `preguntas:{n}` de cada encuesta al mayor Numero de sus
+    preguntas. Con `reset` antes se borran todos, por si quedaron de encuestas
+    que ya no existen.
+    """
+    counters = database["contadores"]
+    if reset:
+        counters.delete_many({"_id": {"$regex": "^preguntas:"}})
+    batch = []
+    for survey in database["encuestas"].find({}, {"_id": 0, "NumeroEncuesta": 1, "Preguntas.Numero": 1}):
+        batch.append(UpdateOne({"_id": f"preguntas:{survey['NumeroEncuesta']}"},
+                               {"$max": {"Secuencia": highest_question_number(survey.get("Preguntas"))}},
+                               upsert=True))
+        if len(batch) >= batch_size:
+            counters.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        counters.bulk_write(batch, ordered=False)
+
+
+# Comandos
+def cmd_seed(args):
+    database = mongo_database()
+    checkpoints = database["carga_inicial"]
+    targets = [
+        ("encuestas", args.surveys, seed.SURVEY_DATE_FIELDS),
+        ("respuestas", args.answers, seed.ANSWER_DATE_FIELDS),
+    ]
+    for name, path, date_fields in targets:
+        if path is None:
+            continue
+        if args.reset:
+            seed.reset(checkpoints, database[name])
+        state = seed.load_jsonl(database[name], path, date_fields, checkpoints, args.batch_size)
+        if state is None:
+            print(f"{name}: la colección ya tiene datos, se omite la carga")
+        else:
+            print(f"{name}: carga completa ({state['Insertados']} documentos)")
+    if args.surveys is not None:
+        # Los números de pregunta reservados deben seguir a los de las encuestas cargadas
+        sync_question_counters(database, reset=args.reset, batch_size=args.batch_size)
+    if args.reset:
+        print("Ejecute `python manage.py rebuild-stats` para recalcular las estadísticas")
+
+
+def cmd_bootstrap(args):
+    db = database()
+    applied = db.bootstrap(force=args.force, seed_data=not args.no_seed)
+    if applied:
+        print(f"Esquema actualizado a la versión {db.schema_version()}")
+    else:
+        print(f"El esquema ya está en la versión {db.schema_version()}, no hay nada que hacer")
+
+
+def cmd_check_indexes(args):
+    report = database().check_indexes()
+    missing = False
+    for collection_name, result in report.items():
+        print(f"{collection_name}:")
+        for name, usage in result["uso"].items():
+            print(f"  {name}: {usage['ops']} usos desde {usage['desde']}")
+        for label in ("faltantes", "sin_uso", "no_declarados"):
+            if result[label]:
+                print(f"  {label}: {', '.join(result[label])}")
+        missing = missing or bool(result["faltantes"])
+    return 1 if missing else 0
+
+
+def cmd_rebuild_stats(args):
+    count = database().rebuild_statistics(args.survey)
+    print(f"Estadísticas recalculadas para {count} encuesta(s)")
+
+
+def run_ingest_worker(batch_size):
+    # Cada proceso abre sus propias conexiones
+    client = redis_client()
+    worker = IngestWorker(database(client), client, batch_size=batch_size)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def cmd_ingest(args):
+    if args.workers == 1:
+        return run_ingest_worker(args.batch_size)
+    processes = [
+        multiprocessing.Process(target=run_ingest_worker, args=(args.batch_size,))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def cmd_generate(args):
+    import generate_data
+
+    options = dict(surveys=args.surveys, questions=args.questions, answers=args.answers,
+                   respondents=args.respondents, seed_value=args.seed, workers=args.workers,
+                   block_size=args.block_size)
+    if args.mongo:
+        surveys, answers = generate_data.to_mongo(mongo_uri, DB_NAME, batch_size=args.batch_size, **options)
+        print(f"{surveys} encuestas y {answers} respuestas insertadas; "
+              "ejecute `manage.py rebuild-stats` para la estadística materializada")
+    else:
+        surveys, answers = generate_data.to_jsonl(args.output_dir, **options)
+        print(f"{surveys} encuestas y {answers} respuestas en {args.output_dir}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Tareas de administración de la API de encuestas")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Carga masiva de los archivos JSONL en MongoDB")
+    seed_parser.add_argument("--surveys", default="data_surveys.jsonl", help="Archivo JSONL de encuestas")
+    seed_parser.add_argument("--answers", default="data_answers.jsonl", help="Archivo JSONL de respuestas")
+    seed_parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="Documentos por lote")
+    seed_parser.add_argument("--reset", action="store_true", help="Vacía las colecciones y las recarga desde el inicio")
+    seed_parser.set_defaults(func=cmd_seed)
+
+    bootstrap_parser = commands.add_parser("bootstrap", help="Aplica validadores, índices y datos iniciales (una sola vez por versión)")
+    bootstrap_parser.add_argument("--force", action="store_true", help="Aplica aunque la versión ya esté registrada")
+    bootstrap_parser.add_argument("--no-seed", action="store_true", help="No carga los archivos JSONL")
+    bootstrap_parser.set_defaults(func=cmd_bootstrap)
+
+    indexes_parser = commands.add_parser("check-indexes", help="Reporta índices faltantes o sin uso ($indexStats)")
+    indexes_parser.set_defaults(func=cmd_check_indexes)
+
+    stats_parser = commands.add_parser("rebuild-stats", help="Recalcula la estadística materializada desde respuestas")
+    stats_parser.add_argument("--survey", type=int, help="NumeroEncuesta (por defecto todas)")
+    stats_parser.set_defaults(func=cmd_rebuild_stats)
+
+    ingest_parser = commands.add_parser("ingest", help="Procesa la cola de respuestas encoladas en Redis")
+    ingest_parser.add_argument("--workers", type=int, default=1, help="Cantidad de procesos consumidores")
+    ingest_parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Mensajes por lote")
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    generate_parser = commands.add_parser("generate", help="Genera encuestas y respuestas sintéticas (deterministas por semilla)")
+    generate_parser.add_argument("--surveys", type=int, default=10, help="Cantidad de encuestas")
+    generate_parser.add_argument("--questions", type=int, help="Preguntas por encuesta (por defecto entre 5 y 10)")
+    generate_parser.add_argument("--answers", type=int, default=3, help="Respuestas por encuesta")
+    generate_parser.add_argument("--respondents", type=int, help="Cantidad de encuestados distintos")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Semilla")
+    generate_parser.add_argument("--workers", type=int, help="Procesos (por defecto uno por núcleo)")
+    generate_parser.add_argument("--block-size", type=int, default=100, help="Encuestas por tarea")
+    generate_parser.add_argument("--output-dir", default=".", help="Carpeta de data_surveys.jsonl y data_answers.jsonl")
+    generate_parser.add_argument("--mongo", action="store_true", help="Inserta en MongoDB en lugar de escribir JSONL")
+    generate_parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="Documentos por lote con --mongo")
+    generate_parser.set_defaults(func=cmd_generate)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
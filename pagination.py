@@ -0,0 +1,19 @@
+import base64
+import json
+
+
+def encode_cursor(numero_encuesta):
+    # Cursor opaco para la paginación por llave (after=<cursor>)
+    raw = json.dumps({"n": numero_encuesta}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    # También acepta el NumeroEncuesta directamente (after=<NumeroEncuesta>)
+    if cursor.lstrip("-").isdigit():
+        return int(cursor)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(raw)["n"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
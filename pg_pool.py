@@ -0,0 +1,152 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2 import pool, InterfaceError, OperationalError
+from psycopg2.extensions import cursor as pg_cursor
+
+from instrumentation import record
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class TimedCursor(pg_cursor):
+    """Cursor que mide cada consulta como una ida y vuelta a PostgreSQL."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record("postgres", time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record("postgres", time.perf_counter() - start)
+
+    def callproc(self, procname, parameters=None):
+        start = time.perf_counter()
+        try:
+            return super().callproc(procname, parameters)
+        finally:
+            record("postgres", time.perf_counter() - start)
+
+
+class PostgresPool:
+    """
+    Pool de conexiones de PostgreSQL seguro entre hilos. Cuando todas las
+    conexiones están ocupadas, `getconn` espera hasta `timeout` segundos en
+    lugar de fallar como `ThreadedConnectionPool`. Las conexiones que llevan
+    más de `health_check_interval` segundos sin usarse se validan con
+    `SELECT 1` antes de entregarlas.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=30, health_check_interval=30, **connect_kwargs):
+        connect_kwargs.setdefault("cursor_factory", TimedCursor)
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.checkouts = 0
+        self.in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No PostgreSQL connection available after {self.timeout}s")
+        try:
+            conn = self._pool.getconn()
+            if not self._healthy(conn):
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self.discarded += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - start
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            close = close or conn.closed != 0
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except (InterfaceError, OperationalError):
+            return False
+
+    @contextmanager
+    def connection(self):
+        # Confirma la transacción al salir; si hay un error la revierte
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "wait_total": self.wait_total,
+                "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max": self.wait_max,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+            }
+
+    def close(self):
+        self._pool.closeall()
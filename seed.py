@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+SURVEY_DATE_FIELDS = ["FechaCreacion", "FechaActualizacion"]
+ANSWER_DATE_FIELDS = ["FechaRealizado"]
+
+
+def seed_id(path, line_number):
+    # _id determinista por archivo y línea: reintentar un lote ya insertado
+    # solo produce errores de llave duplicada, que se ignoran.
+    key = f"{os.path.basename(path)}:{line_number}".encode()
+    return ObjectId(hashlib.md5(key).digest()[:12])
+
+
+def read_jsonl(path, date_fields, offset=0, line_number=0):
+    """
+    Lee el archivo de forma perezosa desde `offset` (bytes) y devuelve
+    tuplas (offset_siguiente, linea_siguiente, documento).
+    """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        for line in file:
+            offset += len(line)
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            for field in date_fields:
+                data[field] = datetime.fromisoformat(data[field])
+            data['_id'] = seed_id(path, line_number)
+            yield offset, line_number, data
+
+
+def insert_batch(collection, batch):
+    try:
+        return len(collection.insert_many(batch, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY for error in errors):
+            raise
+        return e.details.get('nInserted', 0)
+
+
+def load_jsonl(collection, path, date_fields, checkpoints, batch_size=1000, report=print):
+    """
+    Carga un archivo JSONL en `collection` con lotes desordenados de
+    `batch_size` documentos. Después de cada lote guarda en `checkpoints`
+    la posición alcanzada, de modo que una carga interrumpida continúa
+    donde quedó. Devuelve el estado final de la carga.
+    """
+    state = checkpoints.find_one({"_id": collection.name})
+    if state is None and collection.estimated_document_count() > 0:
+        # Colección poblada antes de existir los checkpoints
+        return None
+    if state is not None and state["Archivo"] != path:
+        # El offset guardado es de otro archivo: se empieza desde el inicio
+        state = None
+    state = state or {"_id": collection.name, "Archivo": path, "Offset": 0, "Linea": 0, "Insertados": 0, "Completo": False}
+    if state["Completo"]:
+        return state
+
+    start = time.monotonic()
+    loaded = 0
+    batch = []
+
+    def flush(offset, line_number):
+        nonlocal loaded
+        inserted = insert_batch(collection, batch)
+        loaded += inserted
+        batch.clear()
+        state.update({"Archivo": path, "Offset": offset, "Linea": line_number, "Insertados": state["Insertados"] + inserted})
+        checkpoints.replace_one({"_id": collection.name}, state, upsert=True)
+        elapsed = time.monotonic() - start
+        report(f"{collection.name}: línea {line_number}, {state['Insertados']} insertados, {loaded / elapsed if elapsed else 0:.0f} docs/s")
+
+    offset, line_number = state["Offset"], state["Linea"]
+    for offset, line_number, data in read_jsonl(path, date_fields, offset, line_number):
+        batch.append(data)
+        if len(batch) >= batch_size:
+            flush(offset, line_number)
+    if batch:
+        flush(offset, line_number)
+
+    state["Completo"] = True
+    checkpoints.replace_one({"_id": collection.name}, state, upsert=True)
+    return state
+
+
+def reset(checkpoints, collection):
+    """Vacía la colección y borra su checkpoint para recargarla completa."""
+    collection.delete_many({})
+    checkpoints.delete_one({"_id": collection.name})
@@ -0,0 +1,33 @@
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def datetime_converter(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _orjson_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError
+
+
+def dumps(value):
+    """
+    Única serialización de las respuestas JSON, en caché o no. Devuelve
+    bytes; con orjson las fechas salen en ISO 8601, igual que sin él.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=datetime_converter, separators=(",", ":"), ensure_ascii=False).encode()
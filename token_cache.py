@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict
+
+from cache import INVALIDATION_CHANNEL
+
+
+class TokenCache:
+    """
+    Caché de sesiones por token: (id de usuario, rol, sesión activa).
+    Un LRU en memoria con TTL corto atiende la mayoría de las consultas y,
+    si se configura `redis_client`, Redis guarda las sesiones compartidas
+    entre procesos con un TTL más largo. Cerrar sesión o borrar un usuario
+    publica las llaves en INVALIDATION_CHANNEL para que los demás procesos
+    las saquen de su LRU (apply_invalidations, vía Cache.subscribe).
+    """
+
+    def __init__(self, redis_client=None, maxsize=10000, ttl=30, redis_ttl=300):
+        self.redis = redis_client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self._local = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return f"token:{token}"
+
+    @staticmethod
+    def _user_key(user_id):
+        return f"usuario_tokens:{user_id}"
+
+    def apply_invalidations(self, keys):
+        if keys is None:
+            with self._lock:
+                self._local.clear()
+                self._tokens_by_user.clear()
+            return
+        for key in keys:
+            if key.startswith("token:"):
+                self._invalidate_local(key[len("token:"):])
+            elif key.startswith("usuario_tokens:"):
+                try:
+                    self._invalidate_user_local(int(key[len("usuario_tokens:"):]))
+                except ValueError:
+                    pass
+
+    @staticmethod
+    def _encode(session):
+        user_id, role, active = session
+        return f"{user_id}:{role}:{1 if active else 0}"
+
+    @staticmethod
+    def _decode(cached):
+        user_id, role, active = cached.split(":")
+        return (int(user_id), int(role), active == "1")
+
+    def _get_local(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(token)
+            if entry:
+                expires, session = entry
+                if expires > now:
+                    self._local.move_to_end(token)
+                    return session
+                del self._local[token]
+                self._forget(token, session[0])
+        return None
+
+    def _forget(self, token, user_id):
+        # Con el candado tomado: saca el token del índice por usuario
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+    def get(self, token):
+        token = str(token)
+        session = self._get_local(token)
+        if session or self.redis is None:
+            return session
+        cached = self.redis.get(self._key(token))
+        if not cached:
+            return None
+        session = self._decode(cached)
+        self._store_local(token, session)
+        return session
+
+    def _set_pipeline(self, token, session):
+        pipe = self.redis.pipeline()
+        pipe.setex(self._key(token), self.redis_ttl, self._encode(session))
+        pipe.sadd(self._user_key(session[0]), token)
+        pipe.expire(self._user_key(session[0]), self.redis_ttl)
+        return pipe
+
+    def set(self, token, session):
+        token = str(token)
+        self._store_local(token, session)
+        if self.redis is not None:
+            self._set_pipeline(token, session).execute()
+
+    def _store_local(self, token, session):
+        with self._lock:
+            self._local[token] = (time.monotonic() + self.ttl, session)
+            self._local.move_to_end(token)
+            self._tokens_by_user.setdefault(session[0], set()).add(token)
+            while len(self._local) > self.maxsize:
+                old_token, (_, old_session) = self._local.popitem(last=False)
+                self._forget(old_token, old_session[0])
+
+    def _invalidate_local(self, token):
+        with self._lock:
+            entry = self._local.pop(token, None)
+            if entry:
+                self._forget(token, entry[1][0])
+
+    def _invalidate_pipeline(self, token):
+        pipe = self.redis.pipeline()
+        pipe.delete(self._key(token))
+        pipe.publish(INVALIDATION_CHANNEL, self._key(token))
+        return pipe
+
+    def invalidate(self, token):
+        token = str(token)
+        self._invalidate_local(token)
+        if self.redis is not None:
+            self._invalidate_pipeline(token).execute()
+
+    def _invalidate_user_local(self, user_id):
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+            for token in tokens:
+                self._local.pop(token, None)
+        return tokens
+
+    def _invalidate_user_pipeline(self, user_id, tokens):
+        pipe = self.redis.pipeline()
+        keys = [self._key(token) for token in tokens]
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(self._user_key(user_id))
+        pipe.publish(INVALIDATION_CHANNEL, "\n".join(keys + [self._user_key(user_id)]))
+        return pipe
+
+    def invalidate_user(self, user_id):
+        tokens = self._invalidate_user_local(user_id)
+        if self.redis is not None:
+            tokens = set(tokens) | set(self.redis.smembers(self._user_key(user_id)))
+            self._invalidate_user_pipeline(user_id, tokens).execute()
+
+
+class AsyncTokenCache(TokenCache):
+    """TokenCache sobre redis.asyncio, con las mismas llaves y formato."""
+
+    async def get(self, token):
+        token = str(token)
+        session = self._get_local(token)
+        if session or self.redis is None:
+            return session
+        cached = await self.redis.get(self._key(token))
+        if not cached:
+            return None
+        session = self._decode(cached)
+        self._store_local(token, session)
+        return session
+
+    async def set(self, token, session):
+        token = str(token)
+        self._store_local(token, session)
+        if self.redis is not None:
+            await self._set_pipeline(token, session).execute()
+
+    async def invalidate(self, token):
+        token = str(token)
+        self._invalidate_local(token)
+        if self.redis is not None:
+            await self._invalidate_pipeline(token).execute()
+
+    async def invalidate_user(self, user_id):
+        tokens = self._invalidate_user_local(user_id)
+        if self.redis is not None:
+            tokens = set(tokens) | set(await self.redis.smembers(self._user_key(user_id)))
+            await self._invalidate_user_pipeline(user_id, tokens).execute()
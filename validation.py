@@ -0,0 +1,182 @@
+import threading
+import time
+from datetime import datetime
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+BSON_TYPES = {
+    "int": _is_int,
+    "long": _is_int,
+    "double": lambda value: isinstance(value, float),
+    "string": lambda value: isinstance(value, str),
+    "bool": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+    "date": lambda value: isinstance(value, datetime),
+}
+
+
+def compile_schema(schema):
+    """
+    Compila el subconjunto de $jsonSchema usado en json_schemas.py
+    (bsonType, required, properties, items) a una función
+    `validate(document, path)` que devuelve la lista de errores. Así las
+    respuestas se validan en el proceso, antes de ir a MongoDB.
+    """
+    schema = schema.get("$jsonSchema", schema)
+    bson_types = schema.get("bsonType")
+    if isinstance(bson_types, str):
+        bson_types = [bson_types]
+    type_checks = [BSON_TYPES[bson_type] for bson_type in bson_types or []]
+    required = schema.get("required", [])
+    properties = {field: compile_schema(subschema) for field, subschema in schema.get("properties", {}).items()}
+    items = compile_schema(schema["items"]) if "items" in schema else None
+
+    def validate(document, path="documento"):
+        if type_checks and not any(check(document) for check in type_checks):
+            return [f"{path}: must be {' or '.join(bson_types)}"]
+        errors = []
+        if isinstance(document, dict):
+            errors.extend(f"{path}.{field}: is required" for field in required if field not in document)
+            for field, validate_field in properties.items():
+                if field in document:
+                    errors.extend(validate_field(document[field], f"{path}.{field}"))
+        if items is not None and isinstance(document, list):
+            for index, item in enumerate(document):
+                errors.extend(items(item, f"{path}[{index}]"))
+        return errors
+
+    return validate
+
+
+def compile_question(question):
+    """Reglas de una pregunta según su Categoria y sus Opciones."""
+    number = question["Numero"]
+    category = question["Categoria"]
+    options = question.get("Opciones") or []
+    option_set = set(options)
+
+    def check_answer(answer):
+        value = answer["Respuesta"]
+        if category == "Abiertas":
+            return None if isinstance(value, str) else "must be a string"
+        if category == "EleccionSimples":
+            # Las opciones pueden ser textos o números: se compara con la lista
+            return None if value in options else f"must be one of {options}"
+        if category == "EleccionMultiples":
+            if not isinstance(value, list) or not value:
+                return "must be a non-empty array"
+            if not all(isinstance(item, (str, int, float)) for item in value):
+                return "items must be strings or numbers"
+            if len(set(value)) != len(value):
+                return "must not repeat options"
+            invalid = [item for item in value if item not in option_set]
+            return f"invalid options {invalid}, must be in {options}" if invalid else None
+        if category == "EscalaCalificacion":
+            if len(options) < 2:
+                # Sin rango definido en la encuesta solo se exige un entero
+                return None if _is_int(value) else "must be an integer"
+            low, high = options[0], options[-1]
+            return None if _is_int(value) and low <= value <= high else f"must be an integer between {low} and {high}"
+        if category == "SiNo":
+            return None if value in (0, 1) and _is_int(value) else "must be 0 or 1"
+        if category == "Numericas":
+            return None if _is_int(value) else "must be an integer"
+        return None
+
+    def validate(answer, path):
+        if answer["Categoria"] != category:
+            return [f"{path}.Categoria: question {number} is {category}"]
+        error = check_answer(answer)
+        return [f"{path}.Respuesta: {error}"] if error else []
+
+    return validate
+
+
+def compile_survey(survey, answer_schema):
+    """
+    Validador de respuestas para una encuesta: el esquema de `answer_schema`
+    más las reglas de cada pregunta (categoría, opciones y rango de la
+    escala). Se compila una vez por versión de la encuesta.
+    """
+    validate_schema = compile_schema(answer_schema)
+    questions = {question["Numero"]: compile_question(question) for question in survey.get("Preguntas", [])}
+    number = survey["NumeroEncuesta"]
+
+    def validate(answer):
+        errors = validate_schema(answer)
+        if errors:
+            return errors
+        if answer["NumeroEncuesta"] != number:
+            return [f"documento.NumeroEncuesta: must be {number}"]
+        for index, question in enumerate(answer["Preguntas"]):
+            path = f"documento.Preguntas[{index}]"
+            rule = questions.get(question["Numero"])
+            if rule is None:
+                errors.append(f"{path}.Numero: question {question['Numero']} does not exist")
+            else:
+                errors.extend(rule(question, path))
+        return errors
+
+    return validate
+
+
+def missing_survey(number):
+    def validate(answer):
+        return [f"documento.NumeroEncuesta: survey {number} does not exist"]
+    return validate
+
+
+class ValidatorCache:
+    """
+    Validadores compilados por NumeroEncuesta. Se invalidan al editar la
+    encuesta o sus preguntas; los demás procesos reciben la llave
+    `validador:<número>` por el canal de invalidaciones de cache.py y el TTL
+    acota cuánto puede durar uno viejo si se pierde el aviso.
+    """
+
+    PREFIX = "validador:"
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def key(cls, number):
+        return f"{cls.PREFIX}{number}"
+
+    def cached(self, number):
+        with self._lock:
+            entry = self._validators.get(number)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, number, validator):
+        with self._lock:
+            self._validators[number] = (time.monotonic() + self.ttl, validator)
+        return validator
+
+    def invalidate(self, number):
+        with self._lock:
+            self._validators.pop(number, None)
+
+    def clear(self):
+        with self._lock:
+            self._validators.clear()
+
+    def apply_invalidations(self, keys):
+        # Handler de Cache.subscribe
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            if key.startswith(self.PREFIX):
+                try:
+                    self.invalidate(int(key[len(self.PREFIX):]))
+                except ValueError:
+                    pass